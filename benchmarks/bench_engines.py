@@ -0,0 +1,55 @@
+"""Compare matching engines on a synthetic deep-alternation grammar.
+
+Usage: bench_engines.py [--lines=<list>] [--depth=<list>] [--repeat=<n>]
+
+Options:
+  --lines=<list>   Comma-separated numbers of usage lines
+                   [default: 10,30,100].
+  --depth=<list>   Comma-separated nesting depths of alternatives
+                   [default: 2,8,16].
+  --repeat=<n>     Number of timed parses per measurement [default: 100].
+
+Every usage line starts with the same nested group of alternatives,
+"[(a0|b0) [(a1|b1) [...]]]", followed by its own command, and argv picks the
+last line, so the backtracking engine re-matches the group once per line.
+
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+from docopt import docopt, compile
+
+
+def grammar(lines, depth):
+    group = ''
+    for i in reversed(range(depth)):
+        group = '[(a%d | b%d) %s]' % (i, i, group)
+    doc = 'Usage:\n' + ''.join('  prog %s cmd%d <x>\n' % (group, n)
+                               for n in range(lines))
+    argv = ['b%d' % i for i in range(depth)] + ['cmd%d' % (lines - 1), 'x']
+    return doc, argv
+
+
+def main():
+    arguments = docopt(__doc__)
+    repeat = int(arguments['--repeat'])
+    lines = [int(n) for n in arguments['--lines'].split(',')]
+    depths = [int(n) for n in arguments['--depth'].split(',')]
+    print('%6s %6s %14s %14s' % ('lines', 'depth', 'backtrack, us',
+                                 'packrat, us'))
+    for n in lines:
+        for d in depths:
+            doc, argv = grammar(n, d)
+            parser = compile(doc)
+            assert parser.parse(argv) == parser.parse(argv, engine='packrat')
+            times = [min(timeit.repeat(
+                         lambda: parser.parse(argv, engine=engine),
+                         number=repeat, repeat=3)) / repeat * 1e6
+                     for engine in ('backtrack', 'packrat')]
+            print('%6d %6d %14.1f %14.1f' % ((n, d) + tuple(times)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Time `Pattern.fix` on synthetic usage patterns of growing size.
+
+Usage: bench_fix.py [--leaves=<list>]
+
+Options:
+  --leaves=<list>  Comma-separated numbers of leaves of patterns
+                   [default: 1000,3000,10000].
+
+Shapes of patterns:
+
+  lines   usage lines "prog cmd<i> <a> [<b>] (-x | -y)"
+  groups  one line of optional alternatives "[(a<i> | <x>)] [...]", whose
+          expansion into cases has 2**(leaves/2) of them
+  repeat  one line of the same argument "<x> <x> ...", a list argument
+
+Time per leaf should stay flat as patterns grow.
+
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+from docopt import docopt, parse_pattern, formal_usage
+
+
+def usage(shape, leaves):
+    if shape == 'lines':
+        return 'usage:' + ''.join('\n  prog cmd%d <a> [<b>] (-x | -y)' % i
+                                  for i in range(leaves // 5))
+    if shape == 'groups':
+        return 'usage: prog ' + ' '.join('[(a%d | <x>)]' % i
+                                         for i in range(leaves // 2))
+    if shape == 'repeat':
+        return 'usage: prog ' + ' '.join(['<x>'] * leaves)
+
+
+def main():
+    leaves = [int(n) for n in docopt(__doc__)['--leaves'].split(',')]
+    print('%-8s %8s %10s %14s' % ('shape', 'leaves', 'fix, ms',
+                                  'per leaf, us'))
+    for shape in ('lines', 'groups', 'repeat'):
+        for n in leaves:
+            pattern = parse_pattern(formal_usage(usage(shape, n)), [])
+            size = len(pattern.flat)
+            start = time.time()
+            pattern.fix()
+            elapsed = time.time() - start
+            print('%-8s %8d %10.2f %14.2f' % (shape, size, elapsed * 1e3,
+                                              elapsed / size * 1e6))
+
+
+if __name__ == '__main__':
+    main()
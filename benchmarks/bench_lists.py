@@ -0,0 +1,47 @@
+"""Time parsing of argv with growing numbers of list arguments.
+
+Usage: bench_lists.py [--args=<list>] [--engine=<name>]
+
+Options:
+  --args=<list>    Comma-separated numbers of arguments in argv
+                   [default: 10,100,1000,10000,100000,1000000].
+  --engine=<name>  Matching engine, one of `docopt.engines`
+                   [default: backtrack].
+
+Argv is "-v <file>..." for usage "prog [-v] <file>... [-o FILE]", like
+a list of paths from `find`.  Time per argument should stay flat.
+
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+from docopt import docopt, compile
+
+
+doc = """Usage: prog [-v] <file>... [-o FILE]
+
+Options:
+  -v       Be verbose.
+  -o FILE  Output file.
+
+"""
+
+
+def main():
+    arguments = docopt(__doc__)
+    parser = compile(doc)
+    engine = arguments['--engine']
+    print('%10s %12s %14s' % ('args', 'parse, ms', 'per arg, us'))
+    for n in [int(n) for n in arguments['--args'].split(',')]:
+        argv = ['-v'] + ['file%d' % i for i in range(n)]
+        start = time.time()
+        result = parser.parse(argv, engine=engine)
+        elapsed = time.time() - start
+        assert len(result['<file>']) == n
+        print('%10d %12.2f %14.3f' % (n, elapsed * 1e3, elapsed / n * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Fit growth of compile and parse times on synthetic usages, and flag
+super-quadratic ones.
+
+Usage: complexity.py [--quick] [--only=<family>] [--seed=<n>]
+                     [--max-exponent=<k>]
+
+Options:
+  --quick              Use fewer and smaller sizes.
+  --only=<family>      Check only families whose name starts with <family>.
+  --seed=<n>           Seed of `synthetic` usages and argvs [default: 0].
+  --max-exponent=<k>   Exit with status 1 if any time grows faster than
+                       size to the power <k> [default: 2].
+
+Each family scales one shape parameter of `synthetic.usage`, or the length
+of argv, through growing sizes.  For each size, it times
+
+  compile  compile(doc)
+  accept   Parser.parse(argv) of an argv that matches, the worst case one
+           where the shape has alternatives
+  reject   Parser.parse(argv) of that argv with one token appended, so that
+           it doesn't match: "extra", or an unknown option where the
+           usage takes any number of arguments
+
+and fits time = c * size ** k by least squares on a log-log scale.  The
+rejected argv takes the same mutation at every size: a random one would
+land at a random place, and its time would follow the place, not the size.
+
+"""
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+from docopt import docopt, compile, DocoptExit
+from suite import measure
+import synthetic
+
+
+def lines(n, seed):
+    return synthetic.usage(seed, commands=n, options=1), {'worst': True}
+
+
+def options(n, seed):
+    return (synthetic.usage(seed, options=n, collisions=True),
+            {'given': n // 2, 'worst': True, 'abbreviate': True})
+
+
+def depth(n, seed):
+    return synthetic.usage(seed, commands=4, depth=n, shared=True), \
+           {'worst': True}
+
+
+def width(n, seed):
+    return synthetic.usage(seed, commands=4, depth=2, width=n, shared=True), \
+           {'worst': True}
+
+
+def repeat(n, seed):
+    # argv of repeats ** 2 tokens, as each turn of outer group repeats inner
+    return synthetic.usage(seed, commands=2, depth=2, repeat=True), \
+           {'repeats': int(round(n ** 0.5)), 'worst': True}
+
+
+def argv(n, seed):
+    return 'Usage: prog [-v] <file>...\n\n-v  Verbose.', \
+           {'repeats': n, 'worst': True, 'reject': '--no-such-option'}
+
+
+families = [(lines, [25, 50, 100, 200, 400]),
+            (options, [25, 50, 100, 200, 400]),
+            (depth, [4, 8, 16, 32, 64]),
+            (width, [4, 8, 16, 32, 64]),
+            (repeat, [64, 256, 1024, 4096, 16384]),
+            (argv, [1000, 2000, 4000, 8000, 16000])]
+
+
+def exponent(sizes, times):
+    """Return slope of least squares line through (log size, log time)."""
+    xs = [math.log(n) for n in sizes]
+    ys = [math.log(max(t, 1e-9)) for t in times]
+    mx, my = sum(xs) / len(xs), sum(ys) / len(ys)
+    return (sum((x - mx) * (y - my) for x, y in zip(xs, ys)) /
+            sum((x - mx) ** 2 for x in xs))
+
+
+def reject(parser, argv):
+    try:
+        parser.parse(argv, help=False)
+    except DocoptExit:
+        return
+    raise AssertionError('%r should not match' % (argv,))
+
+
+def timings(family, n, seed):
+    """Return {phase: seconds per call} for size `n` of `family`."""
+    doc, walk = family(n, seed)
+    extra = walk.pop('reject', 'extra')
+    parser = compile(doc)
+    accept = synthetic.argvs(doc, seed, count=1, **walk)[0]
+    failing = accept + [extra]
+    return {'compile': measure(lambda _: compile(doc)),
+            'accept': measure(lambda _: parser.parse(accept, help=False)),
+            'reject': measure(lambda _: reject(parser, failing))}
+
+
+def check(family, sizes, seed):
+    """Return {phase: (exponent, [seconds per call by size])}."""
+    results = {}
+    for n in sizes:
+        for phase, seconds in timings(family, n, seed).items():
+            results.setdefault(phase, []).append(seconds)
+    return dict((phase, (exponent(sizes[:len(times)], times), times))
+                for phase, times in results.items())
+
+
+def main():
+    arguments = docopt(__doc__)
+    only, seed = arguments['--only'] or '', int(arguments['--seed'])
+    limit = float(arguments['--max-exponent'])
+    flagged = []
+    for family, sizes in families:
+        if not family.__name__.startswith(only):
+            continue
+        if arguments['--quick']:
+            sizes = sizes[:3]
+        print('%s: sizes %s' % (family.__name__,
+                                ', '.join(str(n) for n in sizes)))
+        for phase, (k, times) in sorted(check(family, sizes, seed).items()):
+            flag = k > limit
+            print('  %-8s k=%5.2f  %s%s' % (phase, k, ' '.join(
+                    '%9.1f' % (t * 1e6) for t in times),
+                    '  > %g' % limit if flag else ''))
+            if flag:
+                flagged.append('%s:%s' % (family.__name__, phase))
+    if flagged:
+        print('Grows faster than size ** %g: %s' % (limit, ', '.join(flagged)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Measure memory of each phase of docopt on the examples and on long argvs,
+and check it against budgets.
+
+Usage: memory.py [--quick] [--budgets=FILE] [--update] [--headroom=<ratio>]
+
+Options:
+  --quick              Skip the longest argv.
+  --budgets=FILE       JSON file of budgets, by default memory_budgets.json
+                       next to this script.
+  --update             Set budgets to measured bytes times <ratio>.
+  --headroom=<ratio>   Headroom given by --update [default: 1.5].
+
+Memory is traced with `tracemalloc` (Python 3.4+) by `docopt.profile`,
+for one call of `compile(doc).parse(argv)` per case.  Budgets are in bytes,
+keyed by "case:phase" for the peak of a phase (see `docopt.Profile`), and
+"case:total" for the peak of the whole call; a key "*:phase" applies to
+cases without a budget of their own.  Exits with status 1 if any peak is
+over its budget.  Sizes of objects differ between versions of Python, so
+budgets are only meaningful for the version that recorded them.
+
+"""
+from __future__ import with_statement
+import json
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+from docopt import docopt, compile, profile, Profile
+from docopt_codegen import docstring
+import suite
+
+default_budgets = os.path.join(os.path.dirname(__file__),
+                               'memory_budgets.json')
+
+
+def cases(quick=False):
+    """Yield (name, doc, argv) of examples and of argvs of many files."""
+    directory = os.path.join(os.path.dirname(__file__), os.pardir, 'examples')
+    for name in sorted(suite.examples):
+        yield ('examples/' + name, docstring(os.path.join(directory, name)),
+               suite.examples[name].split())
+    for n in [10000] if quick else [10000, 100000]:
+        doc, argv = suite.argv(n)
+        yield 'argv/%d' % n, doc, argv
+
+
+def measure(quick=False):
+    """Return {"case:phase": peak bytes}, with "case:total" for whole call."""
+    results = {}
+    for name, doc, argv in cases(quick):
+        with profile(memory=True) as p:
+            compile(doc).parse(argv, help=False)
+        for phase in Profile.phases:
+            results['%s:%s' % (name, phase)] = p.peak[phase]
+        # laps reset the peak, so the whole call is traced apart
+        results['%s:total' % name] = suite.peak(
+                lambda: compile(doc).parse(argv, help=False))
+    return results
+
+
+def python():
+    return '%d.%d' % sys.version_info[:2]
+
+
+def budget(budgets, key):
+    return budgets.get(key, budgets.get('*:' + key.rpartition(':')[2]))
+
+
+def check(results, budgets):
+    """Return (key, budget, peak) of peaks over budget."""
+    over = []
+    for key in sorted(results):
+        limit = budget(budgets, key)
+        if limit is not None and results[key] > limit:
+            over.append((key, limit, results[key]))
+    return over
+
+
+def main():
+    arguments = docopt(__doc__)
+    path = arguments['--budgets'] or default_budgets
+    results = measure(arguments['--quick'])
+    phases = Profile.phases + ('total',)
+    print('%-32s %s' % ('peak, KiB', ' '.join('%8s' % p for p in phases)))
+    for name in sorted(set(key.rpartition(':')[0] for key in results)):
+        print('%-32s %s' % (name, ' '.join(
+                '%8.1f' % (results['%s:%s' % (name, p)] / 1024.0)
+                for p in phases)))
+    if arguments['--update']:
+        headroom = float(arguments['--headroom'])
+        budgets = dict((key, int(math.ceil(max(bytes, 1024) * headroom)))
+                       for key, bytes in results.items())
+        with open(path, 'w') as f:
+            json.dump({'python': python(), 'budgets': budgets}, f, indent=1,
+                      sort_keys=True)
+            f.write('\n')
+        return
+    with open(path) as f:
+        recorded = json.load(f)
+    if recorded['python'] != python():
+        print('Budgets were recorded with Python %s, not %s.' %
+              (recorded['python'], python()))
+    over = check(results, recorded['budgets'])
+    for key, limit, peak in over:
+        print('OVER BUDGET %s: %d > %d bytes' % (key, peak, limit))
+    if over:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""Time each phase of docopt on the examples and on synthetic grammars.
+
+Usage:
+  suite.py [--quick] [--only=<case>] [-o FILE] [--baseline=FILE]
+           [--tolerance=<ratio>]
+
+Options:
+  --quick              Run smaller synthetic cases.
+  --only=<case>        Run only cases whose name starts with <case>.
+  -o FILE              Save results as JSON to FILE.
+  --baseline=FILE      Compare results with those saved in FILE, exit with
+                       status 1 if any phase got slower by over <ratio>.
+  --tolerance=<ratio>  Slowdown tolerated by --baseline [default: 2].
+
+Phases are the steps of `docopt(doc, argv)`:
+
+  usage    printable_usage(doc)
+  options  parse_doc_options(doc)
+  pattern  parse_pattern(formal_usage(usage), options)
+  fix      Pattern.fix()
+  tokens   parse_args(argv, options)
+  match    Pattern.match(tokens)
+  parse    all of the above but compiling, i.e. Parser.parse(argv)
+
+Cases are usages of examples/*.py, and usages from `synthetic` scaled by
+number of usage lines, of options, by nesting depth of groups and by length
+of argv.  Each phase is timed as the minimum over 7 runs of enough calls to
+take 20ms (at most 10000 calls); peak memory of `docopt` is measured with
+`tracemalloc` where available (Python 3.4+).
+
+Times of a few microseconds still vary by half from run to run, so the
+comparison with a baseline takes times under 10us as if they took 10us.
+Even so, a timing gate is only meaningful on a quiet machine, and against
+a baseline saved on the same one.
+
+"""
+from __future__ import with_statement
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+import docopt as _docopt
+from docopt import (docopt, compile, printable_usage, parse_doc_options,
+                    parse_pattern, formal_usage, parse_args)
+from docopt_codegen import docstring
+import synthetic
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+examples = {
+    'any_options_example.py': '-q --apply -n 3 --timeout 5 8080',
+    'arguments_example.py': '-vqr file1 file2',
+    'calculator_example.py': '1 + 2 + 3 + 4 + 5',
+    'git_example.py': 'remote add -t br -m ma -f --tags origin url',
+    'naval_fate.py': 'ship Guardian move 150 300 --speed=20',
+    'odd_even_example.py': '1 2 3 4 5 6 7 8',
+    'options_example.py': '-v --exclude=.svn --ignore=E3 --count src',
+    'quick_example.py': 'tcp 127.0.0.1 80 --timeout 30',
+}
+
+
+def lines(n):
+    """Usage of `n` lines, argv matching the last one."""
+    doc = synthetic.usage(commands=n, options=1)
+    return doc, synthetic.argvs(doc, count=1, worst=True)[0]
+
+
+def options(n):
+    """Usage "[options]" of `n` colliding options, half of them given."""
+    doc = synthetic.usage(options=n, collisions=True)
+    return doc, synthetic.argvs(doc, count=1, given=n // 2, worst=True,
+                                abbreviate=True)[0]
+
+
+def depth(n):
+    """Usage of 4 lines sharing groups of alternatives nested `n` deep."""
+    doc = synthetic.usage(commands=4, depth=n, shared=True)
+    return doc, synthetic.argvs(doc, count=1, worst=True)[0]
+
+
+def argv(n):
+    """Usage "[-v] <file>..." with `n` files."""
+    return ('Usage: prog [-v] <file>...\n\n-v  Verbose.',
+            ['-v'] + ['file%d' % i for i in range(n)])
+
+
+def cases(quick=False):
+    """Yield (name, doc, argv) of every case."""
+    directory = os.path.join(os.path.dirname(__file__), os.pardir, 'examples')
+    for name in sorted(examples):
+        yield ('examples/' + name,
+               docstring(os.path.join(directory, name)),
+               examples[name].split())
+    sizes = {lines: [10, 100] if quick else [10, 100, 1000],
+             options: [10, 100] if quick else [10, 100, 1000],
+             depth: [2, 8] if quick else [2, 8, 16],
+             argv: [1, 100, 10000] if quick else [1, 100, 10000, 100000]}
+    for shape in (lines, options, depth, argv):
+        for n in sizes[shape]:
+            doc, args = shape(n)
+            yield '%s/%d' % (shape.__name__, n), doc, args
+
+
+def measure(run, prepare=lambda: None, budget=0.02, repeat=7):
+    """Return seconds per call of `run(prepare())`, not timing `prepare`."""
+    timer, number = timeit.default_timer, 1
+    while True:
+        times, overhead = [], timer()
+        for _ in range(repeat):
+            inputs = [prepare() for _ in range(number)]
+            start = timer()
+            for i in inputs:
+                run(i)
+            times.append((timer() - start) / number)
+        best = min(times)
+        spent = (timer() - overhead) / repeat / number  # with `prepare`
+        if best * number >= budget or spent * number >= budget or \
+                number >= 10000:
+            return best
+        number = min(10000, max(number * 10,
+                                int(budget / max(spent, 1e-9))))
+
+
+def peak(function):
+    if tracemalloc is None:
+        return None
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def phases(doc, argv):
+    """Return {phase: seconds per call} for `docopt(doc, argv)`."""
+    usage = printable_usage(doc)
+    formal = formal_usage(usage)
+    parser = compile(doc)
+    tokens = parse_args(argv, parser.options)
+    return {
+        'usage': measure(lambda _: printable_usage(doc)),
+        'options': measure(lambda _: parse_doc_options(doc)),
+        'pattern': measure(lambda o: parse_pattern(formal, o),
+                           lambda: parse_doc_options(doc)),
+        'fix': measure(lambda p: p.fix(),
+                       lambda: parse_pattern(formal, parse_doc_options(doc))),
+        'tokens': measure(lambda _: parse_args(argv, parser.options)),
+        'match': measure(lambda _: parser.pattern.match(tokens)),
+        'parse': measure(lambda _: parser.parse(argv, help=False)),
+    }
+
+
+def run(quick=False, only=''):
+    """Return results, as saved in JSON."""
+    results = {}
+    print('%-32s %9s %9s %9s %9s %9s %9s %9s %9s' % (
+            ('case', 'usage', 'options', 'pattern', 'fix', 'tokens', 'match',
+             'parse', 'peak')))
+    print('%-32s %s %9s' % ('', ' '.join(['%9s' % 'us'] * 7), 'KiB'))
+    for name, doc, argv in cases(quick):
+        if not name.startswith(only):
+            continue
+        times = phases(doc, argv)
+        for phase, seconds in times.items():
+            results['%s:%s' % (name, phase)] = seconds
+        memory = peak(lambda: compile(doc).parse(argv, help=False))
+        if memory is not None:
+            results['%s:peak' % name] = memory
+        print('%-32s %s %9s' % (name, ' '.join(
+                '%9.1f' % (times[p] * 1e6) for p in ('usage', 'options',
+                'pattern', 'fix', 'tokens', 'match', 'parse')),
+                '-' if memory is None else '%.1f' % (memory / 1024.0)))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return regressions: (key, baseline, result) slower than tolerated.
+
+    Times under 10us are compared as if they took 10us, since they are
+    mostly noise.
+
+    """
+    regressions = []
+    for key in sorted(set(results) & set(baseline)):
+        floor = 1e-5 if not key.endswith(':peak') else 1024
+        if max(results[key], floor) > tolerance * max(baseline[key], floor):
+            regressions.append((key, baseline[key], results[key]))
+    return regressions
+
+
+def main():
+    arguments = docopt(__doc__)
+    results = run(arguments['--quick'], arguments['--only'] or '')
+    if arguments['-o']:
+        with open(arguments['-o'], 'w') as f:
+            json.dump({'docopt': _docopt.__version__,
+                       'python': '%d.%d' % sys.version_info[:2],
+                       'results': results}, f, indent=1, sort_keys=True)
+    if arguments['--baseline']:
+        with open(arguments['--baseline']) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline,
+                              float(arguments['--tolerance']))
+        for key, before, after in regressions:
+            print('REGRESSION %s: %.3g -> %.3g (x%.2f)' %
+                  (key, before, after, after / before if before else 0))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""Seeded generator of synthetic usage messages and argvs for stress tests.
+
+Usage messages are built from shape parameters:
+
+  commands    number of usage lines, each with its own command
+  options     number of options in the options section, all allowed on
+              every line by the [options] shortcut
+  collisions  long options share a long common prefix, so their shortest
+              unique abbreviations are long too
+  depth       nesting depth of optional groups of alternatives, on each line
+  width       number of alternatives per group
+  repeat      groups may repeat, "[(...|...) ...]..."
+  shared      all lines start with the same groups, so that matching
+              `Either` of lines re-matches them once per line
+
+Argvs are random walks over the compiled pattern, kept if `docopt` accepts
+them (or, for failing argvs, rejects them once mutated), so they are valid
+by definition rather than by construction.  Same seed, same output.
+
+"""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+from docopt import (compile, DocoptExit, Option, Command, AnyOptions, Required,
+                    Optional, OneOrMore, Either)
+
+
+def option_names(n, collisions=False):
+    """Return `n` long option names, none a prefix of another."""
+    digits = len(str(max(n - 1, 0)))
+    stem = '--rarely-used-option-number-' if collisions else '--opt'
+    return ['%s%0*d' % (stem, digits, i) for i in range(n)]
+
+
+def usage(seed=0, commands=1, options=0, collisions=False, depth=0, width=2,
+          repeat=False, shared=False):
+    """Return usage message of the given shape."""
+    rng = random.Random(seed)
+    lines = []
+    for i in range(commands):
+        group, tag = '', '' if shared else 'l%d' % i
+        for d in reversed(range(depth)):
+            group = '[(%s) %s]%s' % (' | '.join('w%d%s_%d' % (k, tag, d)
+                                                for k in range(width)),
+                                     group, '...' if repeat else '')
+        lines.append('  prog %scmd%d <arg>%s' % (group + ' ' if group else '',
+                                                 i, ' [options]' if options
+                                                 else ''))
+    doc = 'Usage:\n' + '\n'.join(lines) + '\n'
+    if options:
+        shorts = rng.sample('abcdefghijklmnopqrstuvwxyz', min(options, 26))
+        doc += '\nOptions:\n'
+        for i, name in enumerate(option_names(options, collisions)):
+            short = '-%s ' % shorts[i] if i < len(shorts) else ''
+            if rng.random() < 0.3:
+                doc += '  %s%s=<v>  Option [default: %d].\n' % (short, name, i)
+            else:
+                doc += '  %s%s  Option.\n' % (short, name)
+    return doc
+
+
+def abbreviations(options):
+    """Return {long name: its shortest unique prefix}."""
+    longs = sorted(o.long for o in options if o.long)
+    result = {}
+    for i, name in enumerate(longs):
+        common = 0
+        for other in longs[max(i - 1, 0):i] + longs[i + 1:i + 2]:
+            while common < min(len(name), len(other)) and \
+                    name[:common + 1] == other[:common + 1]:
+                common += 1
+        result[name] = name[:max(common + 1, 3)]
+    return result
+
+
+class Walk(object):
+
+    """Random walk over a pattern that yields argv tokens."""
+
+    def __init__(self, parser, rng, repeats=3, given=3, worst=False,
+                 abbreviate=False):
+        self.parser, self.rng, self.repeats = parser, rng, repeats
+        self.given, self.worst = given, worst
+        self.abbreviations = abbreviations(parser.options) if abbreviate \
+                             else {}
+
+    def option(self, o):
+        if o.long and (not o.short or self.rng.random() < 0.5):
+            name = self.abbreviations.get(o.long, o.long)
+            return [name + '=v'] if o.argcount else [name]
+        return [o.short, 'v'] if o.argcount else [o.short]
+
+    def __call__(self, p):
+        t, rng = type(p), self.rng
+        if t is Required:
+            return [a for c in p.children for a in self(c)]
+        if t is Optional:
+            return [a for c in p.children if self.worst or rng.random() < 0.5
+                    for a in self(c)]
+        if t is Either:
+            return self(p.children[-1] if self.worst
+                        else rng.choice(p.children))
+        if t is OneOrMore:
+            turns = self.repeats if self.worst else \
+                    rng.randint(1, self.repeats)
+            return [a for _ in range(turns) for a in self(p.children[0])]
+        if t is AnyOptions:
+            options = self.parser.options
+            return [a for o in rng.sample(options, min(len(options),
+                                                       self.given))
+                    for a in self.option(o)]
+        if t is Option:
+            return self.option(p)
+        if t is Command:
+            return [p.name]
+        return ['v%d' % rng.randint(0, 99)]
+
+
+def mutate(argv, rng):
+    """Return `argv` with one token dropped, added or swapped."""
+    argv, i = list(argv), rng.randint(0, len(argv))
+    how = rng.choice(['drop', 'extra', 'unknown', 'swap'])
+    if how == 'drop' and argv:
+        del argv[min(i, len(argv) - 1)]
+    elif how == 'swap' and len(argv) > 1:
+        j = rng.randint(0, len(argv) - 1)
+        i = min(i, len(argv) - 1)
+        argv[i], argv[j] = argv[j], argv[i]
+    elif how == 'unknown':
+        argv.insert(i, '--no-such-option')
+    else:
+        argv.insert(i, 'extra')
+    return argv
+
+
+def argvs(doc, seed=0, count=10, matching=True, repeats=3, given=3,
+          worst=False, abbreviate=False, tries=100):
+    """Return up to `count` argvs that `doc` accepts, or rejects if not
+    `matching`.
+
+    Repetitions take 1 to `repeats` turns and [options] gives `given`
+    options.  With `worst`, every optional part is taken, every repetition
+    takes `repeats` turns and every alternative is the last one, which
+    backtracking tries last.  With `abbreviate`, long options are shortened
+    to their shortest unique prefix.
+
+    """
+    parser, rng = compile(doc), random.Random(seed)
+    walk = Walk(parser, rng, repeats, given, worst, abbreviate)
+    result = []
+    for _ in range(count * tries):
+        if len(result) == count:
+            break
+        argv = walk(parser.pattern)
+        if not matching:
+            argv = mutate(argv, rng)
+        try:
+            parser.parse(argv, help=False)
+            accepted = True
+        except DocoptExit:
+            accepted = False
+        if accepted == matching:
+            result.append(argv)
+    return result
@@ -1,5 +1,13 @@
 import sys
 import re
+import os
+import threading
+import time
+from array import array
+from itertools import islice
+
+
+__version__ = '0.4.1'
 
 
 class DocoptLanguageError(Exception):
@@ -13,30 +21,53 @@ class DocoptExit(SystemExit):
 
     usage = ''
 
-    def __init__(self, message=''):
+    def __init__(self, message='', usage=None):
+        self.reason = message
+        if usage is not None:  # else the class-wide one set by `docopt`
+            self.usage = usage
         SystemExit.__init__(self, (message + '\n' + self.usage).strip())
 
 
 class Pattern(object):
 
+    _hash = None  # leaf patterns cache their hash, see `__hash__`
+
     def __init__(self, *children):
         self.children = list(children)
 
     def __eq__(self, other):
-        return repr(self) == repr(other)
+        return self is other or (type(self) is type(other) and
+                                 self.children == other.children)
+
+    def __ne__(self, other):
+        return not self == other
 
     def __hash__(self):
-        return hash(repr(self))
+        return hash((type(self),) + tuple(self.children))
 
     def __repr__(self):
         return '%s(%s)' % (self.__class__.__name__,
                            ', '.join(repr(a) for a in self.children))
 
+    def match(self, left, collected=None):
+        """Match tokens `left`, return (matched, left, collected)."""
+        collected = [] if collected is None else collected
+        argv, log = Argv(left), []
+        matched, p, m = self._match(argv, 0, argv.mask, log)
+        if not matched:
+            return False, left, collected
+        return True, argv.left(p, m), argv.collect(log, collected)
+
     @property
     def flat(self):
-        if not hasattr(self, 'children'):
-            return [self]
-        return sum([c.flat for c in self.children], [])
+        flat, stack = [], [self]
+        while stack:
+            p = stack.pop()
+            if hasattr(p, 'children'):
+                stack.extend(reversed(p.children))
+            else:
+                flat.append(p)
+        return flat
 
     def fix(self):
         self.fix_identities()
@@ -47,23 +78,44 @@ class Pattern(object):
         """Make pattern-tree tips point to same object if they are equal."""
         if not hasattr(self, 'children'):
             return self
-        uniq = list(set(self.flat)) if uniq == None else uniq
+        uniq = {} if uniq is None else uniq
         for i, c in enumerate(self.children):
             if not hasattr(c, 'children'):
-                assert c in uniq
-                self.children[i] = uniq[uniq.index(c)]
+                self.children[i] = uniq.setdefault(c, c)
             else:
                 c.fix_identities(uniq)
 
     def fix_list_arguments(self):
         """Find arguments that should accumulate values and fix them."""
-        either = [list(c.children) for c in self.either.children]
-        for case in either:
-            case = [c for c in case if case.count(c) > 1]
-            for a in [e for e in case if type(e) == Argument]:
-                a.value = []
+        counts = self.counts()
+        for a in [a for a in self.flat if counts.get(a, 0) > 1]:
+            a.value = []
         return self
 
+    def counts(self):
+        """Count arguments in the cases of `either`, without expanding it.
+
+        Return dict of each argument to the most times (up to 2) it occurs
+        in one of the cases.
+
+        """
+        if not hasattr(self, 'children'):
+            return {self: 1} if type(self) is Argument else {}
+        counts = {}
+        for c in self.children:
+            child = c.counts()
+            if len(child) > len(counts):  # merge smaller dict into larger
+                counts, child = child, counts
+            for a, n in child.items():
+                if type(self) is Either:
+                    counts[a] = max(n, counts.get(a, 0))
+                else:
+                    counts[a] = min(2, n + counts.get(a, 0))
+        if type(self) is OneOrMore:
+            for a in counts:
+                counts[a] = 2
+        return counts
+
     @property
     def either(self):
         """Transform pattern into an equivalent, with only top-level Either."""
@@ -105,23 +157,22 @@ class Argument(Pattern):
         self.name = name
         self.value = value
 
-    def match(self, left, collected=None):
-        collected = [] if collected is None else collected
-        args = [l for l in left if type(l) is Argument]
-        if not len(args):
-            return False, left, collected
-        pos = left.index(args[0])
-        left = left[:pos] + left[pos+1:]
-        if type(self.value) is not list:
-            return True, left, collected + [Argument(self.name, args[0].value)]
-        same_name = [a for a in collected
-                     if type(a) is Argument and a.name == self.name]
-        if len(same_name):
-            same_name[0].value += [args[0].value]
-            return True, left, collected
-        else:
-            return True, left, collected + [Argument(self.name,
-                                                     [args[0].value])]
+    def _match(self, argv, p, m, log):
+        if p < len(argv.args):
+            log.append((self, argv.args[p]))
+            return True, p + 1, m
+        return False, p, m
+
+    def __eq__(self, other):
+        return self is other or (type(self) is type(other) and
+                                 self.name == other.name and
+                                 self.value == other.value)
+
+    def __hash__(self):
+        # value may change (see fix_list_arguments), so it isn't hashed
+        if self._hash is None:
+            self._hash = hash((type(self), self.name))
+        return self._hash
 
     def __repr__(self):
         return 'Argument(%r, %r)' % (self.name, self.value)
@@ -133,14 +184,21 @@ class Command(Pattern):
         self.name = name
         self.value = value
 
-    def match(self, left, collected=None):
-        collected = [] if collected is None else collected
-        args = [l for l in left if type(l) is Argument]
-        if not len(args) or args[0].value != self.name:
-            return False, left, collected
-        pos = left.index(args[0])
-        left = left[:pos] + left[pos+1:]
-        return True, left, collected + [Command(self.name, True)]
+    def _match(self, argv, p, m, log):
+        if p < len(argv.args) and argv.args[p] == self.name:
+            log.append((self, True))
+            return True, p + 1, m
+        return False, p, m
+
+    def __eq__(self, other):
+        return self is other or (type(self) is type(other) and
+                                 self.name == other.name and
+                                 self.value == other.value)
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash((type(self), self.name))
+        return self._hash
 
     def __repr__(self):
         return 'Command(%r, %r)' % (self.name, self.value)
@@ -171,15 +229,22 @@ class Option(Pattern):
             value = matched[0] if matched else None
         return class_(short, long, argcount, value)
 
-    def match(self, left, collected=None):
-        collected = [] if collected is None else collected
-        left_ = []
-        for l in left:
-            # if this is so greedy, how to handle OneOrMore then?
-            if not (type(l) is Option and
-                    (self.short, self.long) == (l.short, l.long)):
-                left_.append(l)
-        return (left != left_), left_, collected
+    def _match(self, argv, p, m, log):
+        # if this is so greedy, how to handle OneOrMore then?
+        bit = argv.bit(self)
+        return bool(m & bit), p, m & ~bit
+
+    def __eq__(self, other):
+        return self is other or (type(self) is type(other) and
+                                 self.short == other.short and
+                                 self.long == other.long and
+                                 self.argcount == other.argcount and
+                                 self.value == other.value)
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash((type(self), self.short, self.long))
+        return self._hash
 
     @property
     def name(self):
@@ -190,90 +255,329 @@ class Option(Pattern):
                                            self.argcount, self.value)
 
 
+class OptionTable(list):
+
+    """List of options, indexed for lookup of argv tokens.
+
+    Long options are indexed by every prefix of their name, so that an
+    abbreviation finds all options it could stand for in one dict lookup;
+    short options are indexed by their character.  Options must be added
+    with `append` to be indexed.
+
+    """
+
+    def __init__(self, options=()):
+        list.__init__(self)
+        self.prefixes, self.shorts = {}, {}
+        for o in options:
+            self.append(o)
+
+    def append(self, option):
+        list.append(self, option)
+        if option.long:
+            for i in range(1, len(option.long) + 1):
+                self.prefixes.setdefault(option.long[:i], []).append(option)
+        if option.short and option.short.lstrip('-'):
+            self.shorts.setdefault(option.short.lstrip('-')[0],
+                                   []).append(option)
+
+    def __reduce__(self):
+        # copy, deepcopy and pickle rebuild the index instead of sharing it
+        return OptionTable, (list(self),)
+
+    def long(self, prefix):
+        """Return long options that start with `prefix`."""
+        return self.prefixes.get(prefix, [])
+
+    def short(self, char):
+        """Return short options named by `char`."""
+        return self.shorts.get(char, [])
+
+
 class AnyOptions(Pattern):
 
-    def match(self, left, collected=None):
-        collected = [] if collected is None else collected
-        left_ = [l for l in left if not type(l) == Option]
-        return (left != left_), left_, collected
+    def _match(self, argv, p, m, log):
+        return bool(m), p, 0
 
 
 class Required(Pattern):
 
-    def match(self, left, collected=None):
-        collected = [] if collected is None else collected
-        l = left
-        c = collected
-        for p in self.children:
-            matched, l, c = p.match(l, c)
+    def _match(self, argv, p, m, log):
+        n, P, M = len(log), p, m
+        for c in self.children:
+            matched, P, M = c._match(argv, P, M, log)
             if not matched:
-                return False, left, collected
-        return True, l, c
+                del log[n:]
+                return False, p, m
+        return True, P, M
 
 
 class Optional(Pattern):
 
-    def match(self, left, collected=None):
-        collected = [] if collected is None else collected
-        for p in self.children:
-            m, left, collected = p.match(left, collected)
-        return True, left, collected
+    def _match(self, argv, p, m, log):
+        for c in self.children:
+            _, p, m = c._match(argv, p, m, log)
+        return True, p, m
 
 
 class OneOrMore(Pattern):
 
-    def match(self, left, collected=None):
+    def _match(self, argv, p, m, log):
         assert len(self.children) == 1
-        collected = [] if collected is None else collected
-        l = left
-        c = collected
-        l_ = None
-        matched = True
-        times = 0
-        while matched:
-            # could it be that something didn't match but changed l or c?
-            matched, l, c = self.children[0].match(l, c)
-            times += 1 if matched else 0
-            if l_ == l:
+        child, P, M, times = self.children[0], p, m, 0
+        if type(child) is Argument:  # takes all positional arguments left
+            log.extend((child, a) for a in argv.args[p:])
+            return p < len(argv.args), len(argv.args), m
+        while True:
+            matched, P_, M_ = child._match(argv, P, M, log)
+            if not matched:
                 break
-            l_ = l
-        if times >= 1:
-            return True, l, c
-        return False, left, collected
+            times += 1
+            if (P_, M_) == (P, M):
+                break
+            P, M = P_, M_
+        return times >= 1, P, M
 
 
 class Either(Pattern):
 
+    def _match(self, argv, p, m, log):
+        n, best = len(log), None
+        for c in self.children:
+            matched, P, M = c._match(argv, p, m, log)
+            size = argv.size(P, M) if matched else None
+            if matched and (best is None or size < best[0]):
+                best = size, P, M, log[n:]
+            del log[n:]
+        if best is None:
+            return False, p, m
+        log.extend(best[3])
+        return True, best[1], best[2]
+
+
+class Argv(object):
+
+    """Argv tokens as seen by matchers, without copying lists of tokens.
+
+    Positional arguments are always consumed in order and options are
+    consumed by kind, so what is left of argv is described by the index `p`
+    of the first positional argument left and a bit mask `m` of kinds of
+    options left.  Matched arguments and commands are reported as entries
+    `(leaf, value)` of the pattern.
+
+    """
+
+    def __init__(self, tokens, bits=None):
+        self.tokens = tokens
+        self.args = [t.value for t in tokens if type(t) is Argument]
+        # kinds in `bits` get fixed bits, the rest in order of appearance
+        self.bits = dict(bits or {})
+        self.counts, self.mask = [0] * len(self.bits), 0
+        for t in tokens:
+            if type(t) is Option:
+                bit = self.bits.setdefault((t.short, t.long), len(self.bits))
+                if bit == len(self.counts):
+                    self.counts.append(0)
+                self.counts[bit] += 1
+                self.mask |= 1 << bit
+
+    def bit(self, option):
+        """Return mask of `option` kind, 0 if there is none in argv."""
+        bit = self.bits.get((option.short, option.long))
+        return 0 if bit is None else 1 << bit
+
+    def size(self, p, m):
+        """Return number of tokens left."""
+        size, i = len(self.args) - p, 0
+        while m:
+            size, m, i = size + (self.counts[i] if m & 1 else 0), m >> 1, i + 1
+        return size
+
+    def left(self, p, m):
+        """Return tokens left, like `left` of `Pattern.match`."""
+        i, left = 0, []
+        for t in self.tokens:
+            if type(t) is Argument:
+                i += 1
+                if i > p:
+                    left.append(t)
+            elif m & 1 << self.bits[t.short, t.long]:
+                left.append(t)
+        return left
+
+    def collect(self, entries, collected=None):
+        """Return entries as `collected` of `Pattern.match`."""
+        collected, lists = list(collected or []), {}
+        for i, a in enumerate(collected):
+            if type(a) is Argument and type(a.value) is list and \
+                    a.name not in lists:
+                collected[i] = lists[a.name] = Argument(a.name, list(a.value))
+        for leaf, value in entries:
+            if type(leaf) is Command:
+                collected.append(Command(leaf.name, True))
+            elif type(leaf.value) is not list:
+                collected.append(Argument(leaf.name, value))
+            elif leaf.name in lists:
+                lists[leaf.name].value.append(value)
+            else:
+                lists[leaf.name] = Argument(leaf.name, [value])
+                collected.append(lists[leaf.name])
+        return collected
+
+
+class Packrat(object):
+
+    """Matcher that memoizes outcome of each (pattern, argv state) pair.
+
+    Argv state is that of `Argv`.  Equal sub-patterns share memo entries,
+    so work is bounded by number of distinct sub-patterns times number of
+    states, instead of growing with every alternative that repeats them.
+
+    """
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.keys, keys = {}, {}
+        stack = [pattern]
+        while stack:
+            node = stack.pop()
+            self.keys[id(node)] = keys.setdefault(node, len(keys))
+            stack.extend(getattr(node, 'children', []))
+
     def match(self, left, collected=None):
         collected = [] if collected is None else collected
-        outcomes = []
-        for p in self.children:
-            matched, _, _ = outcome = p.match(left, collected)
-            if matched:
-                outcomes.append(outcome)
-        if outcomes:
-            return min(outcomes, key=lambda outcome: len(outcome[1]))
-        return False, left, collected
+        argv = Argv(left)
+        args, keys, memo = argv.args, self.keys, {}
+
+        def join(entries, e):
+            return e if entries is None else \
+                   entries if e is None else [entries, e]
+
+        def match(node, p, m):
+            """Return (matched, p, m, entries), entries as nested pairs."""
+            t = type(node)
+            if t is Argument:
+                if p < len(args):
+                    return True, p + 1, m, (node, args[p])
+                return False, p, m, None
+            if t is Command:
+                if p < len(args) and args[p] == node.name:
+                    return True, p + 1, m, (node, True)
+                return False, p, m, None
+            if t is Option:
+                bit = argv.bit(node)
+                if m & bit:
+                    return True, p, m ^ bit, None
+                return False, p, m, None
+            if t is AnyOptions:
+                return bool(m), p, 0, None
+            key = keys[id(node)], p, m
+            if key in memo:
+                return memo[key]
+            outcome = False, p, m, None
+            if t is Required:
+                P, M, entries = p, m, None
+                for c in node.children:
+                    matched, P, M, e = match(c, P, M)
+                    if not matched:
+                        break
+                    entries = join(entries, e)
+                else:
+                    outcome = True, P, M, entries
+            elif t is Optional:
+                P, M, entries = p, m, None
+                for c in node.children:
+                    matched, P, M, e = match(c, P, M)
+                    entries = join(entries, e)
+                outcome = True, P, M, entries
+            elif t is OneOrMore:
+                P, M, entries, times = p, m, None, 0
+                while True:
+                    matched, P1, M1, e = match(node.children[0], P, M)
+                    if not matched:
+                        break
+                    times += 1
+                    entries = join(entries, e)
+                    if (P1, M1) == (P, M):
+                        break
+                    P, M = P1, M1
+                if times:
+                    outcome = True, P, M, entries
+            elif t is Either:
+                best = None
+                for c in node.children:
+                    o = match(c, p, m)
+                    if o[0] and (best is None or argv.size(o[1], o[2]) <
+                                                 argv.size(best[1], best[2])):
+                        best = o
+                if best is not None:
+                    outcome = best
+            memo[key] = outcome
+            return outcome
+
+        matched, p, m, entries = match(self.pattern, 0, argv.mask)
+        if not matched:
+            return False, left, collected
+        flat, stack = [], [] if entries is None else [entries]
+        while stack:
+            e = stack.pop()
+            if type(e) is list:
+                stack += [e[1], e[0]]
+            else:
+                flat.append(e)
+        return True, argv.left(p, m), argv.collect(flat, collected)
+
+
+def _nfa(pattern):
+    from docopt_nfa import NFA
+    return NFA(pattern)
 
 
-class TokenStream(list):
+def _dfa(pattern):
+    from docopt_nfa import DFA
+    return DFA(pattern)
+
+
+# 'nfa' and 'dfa' prefer earlier alternatives rather than those leaving the
+# fewest tokens, so they may match ambiguous argv differently, see docopt_nfa
+engines = {'backtrack': lambda pattern: pattern, 'packrat': Packrat,
+           'nfa': _nfa, 'dfa': _dfa}
+
+
+class TokenStream(object):
+
+    """Cursor over tokens of a string or of any iterable, read lazily."""
 
     def __init__(self, source, error):
         klass = type(source).__name__
-        self += source.split() if klass in ('str', 'unicode') else source
+        self.tokens = iter(source.split() if klass in ('str', 'unicode')
+                           else source)
         self.error = error
+        self.head = None
+        self.move()
 
     def move(self):
-        return self.pop(0) if len(self) else None
+        token, self.head = self.head, None
+        for self.head in self.tokens:
+            break
+        return token
 
     def current(self):
-        return self[0] if len(self) else None
+        return self.head
+
+    def __iter__(self):
+        """Consume and yield the remaining tokens."""
+        while self.head is not None:
+            yield self.move()
 
 
 def parse_long(tokens, options):
     raw, eq, value = tokens.move().partition('=')
     value = None if eq == value == '' else value
-    opt = [o for o in options if o.long and o.long.startswith(raw)]
+    if isinstance(options, OptionTable):
+        opt = options.long(raw)
+    else:
+        opt = [o for o in options if o.long and o.long.startswith(raw)]
     if len(opt) < 1:
         if tokens.error is DocoptExit:
             raise tokens.error('%s is not recognized' % raw)
@@ -301,8 +605,11 @@ def parse_shorts(tokens, options):
     raw = tokens.move()[1:]
     parsed = []
     while raw != '':
-        opt = [o for o in options
-               if o.short and o.short.lstrip('-').startswith(raw[0])]
+        if isinstance(options, OptionTable):
+            opt = options.short(raw[0])
+        else:
+            opt = [o for o in options
+                   if o.short and o.short.lstrip('-').startswith(raw[0])]
         if len(opt) > 1:
             raise tokens.error('-%s is specified ambiguously %d times' %
                               (raw[0], len(opt)))
@@ -399,20 +706,61 @@ def parse_atom(tokens, options):
 def parse_args(source, options):
     tokens = TokenStream(source, DocoptExit)
     parsed = []
-    while tokens.current() is not None:
-        if tokens.current() == '--':
+    token = tokens.current()
+    while token is not None:
+        if token == '--':
             return parsed + [Argument(None, v) for v in tokens]
-        elif tokens.current().startswith('--'):
+        elif token.startswith('--'):
             parsed += parse_long(tokens, options)
-        elif tokens.current().startswith('-') and tokens.current() != '-':
+        elif token.startswith('-') and token != '-':
             parsed += parse_shorts(tokens, options)
         else:
             parsed.append(Argument(None, tokens.move()))
+        token = tokens.current()
     return parsed
 
 
+def read_lines(f):
+    """Yield non-empty lines of file `f`, without line endings."""
+    for line in f:
+        line = line.rstrip('\r\n')
+        if line:
+            yield line
+
+
+def expand_args(argv):
+    """Yield `argv` with each `@path` replaced by lines of file `path`.
+
+    Files are read lazily, one argument per line.  Tokens after `--` are
+    not expanded.  Like `parse_args`, takes a string of space-separated
+    tokens too.  Files that can't be opened raise `DocoptExit`.
+
+    """
+    klass = type(argv).__name__
+    argv = iter(argv.split() if klass in ('str', 'unicode') else argv)
+    for token in argv:
+        if token == '--':
+            yield token
+            for token in argv:
+                yield token
+        elif token.startswith('@') and len(token) > 1:
+            try:
+                f = open(token[1:])
+            except (IOError, OSError):
+                raise DocoptExit('cannot read %s: %s' % (
+                        token[1:], sys.exc_info()[1].strerror))
+            try:
+                for line in read_lines(f):
+                    yield line
+            finally:
+                f.close()
+        else:
+            yield token
+
+
 def parse_doc_options(doc):
-    return [Option.parse('-' + s) for s in re.split('^ *-|\n *-', doc)[1:]]
+    return OptionTable(Option.parse('-' + s)
+                       for s in re.split('^ *-|\n *-', doc)[1:])
 
 
 def printable_usage(doc):
@@ -444,17 +792,829 @@ class Dict(dict):
         return '{%s}' % ',\n '.join('%r: %r' % i for i in sorted(self.items()))
 
 
-def docopt(doc, argv=sys.argv[1:], help=True, version=None):
-    DocoptExit.usage = docopt.usage = usage = printable_usage(doc)
-    pot_options = parse_doc_options(doc)
-    formal_pattern = parse_pattern(formal_usage(usage), options=pot_options)
-    argv = parse_args(argv, options=pot_options)
-    extras(help, version, argv, doc)
-    matched, left, arguments = formal_pattern.fix().match(argv)
-    if matched and left == []:  # better message if left?
-        options = [o for o in argv if type(o) is Option]
-        pot_arguments = [a for a in formal_pattern.flat
-                         if type(a) in [Argument, Command]]
-        return Dict((a.name, a.value) for a in
-                    (pot_options + options + pot_arguments + arguments))
-    raise DocoptExit()
+class Parser(object):
+
+    """Usage message compiled once, ready to be matched against argv."""
+
+    def __init__(self, doc):
+        profiling = _profile
+        if profiling:
+            profiling.lap()
+        usage = printable_usage(doc)
+        if profiling:
+            profiling.lap('usage')
+        options = parse_doc_options(doc)
+        if profiling:
+            profiling.lap('options')
+        pattern = parse_pattern(formal_usage(usage), options=options)
+        if profiling:
+            profiling.lap('pattern')
+        pattern = pattern.fix()
+        if profiling:
+            profiling.lap('fix')
+        self._freeze(doc, usage, options, pattern)
+
+    def _freeze(self, doc, usage, options, pattern):
+        arguments = [a for a in pattern.flat if type(a) in [Argument, Command]]
+        for name, value in [('doc', doc), ('usage', usage),
+                            ('options', options), ('pattern', pattern),
+                            ('arguments', arguments), ('_matchers', {})]:
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('%s object is immutable' % type(self).__name__)
+
+    def matcher(self, engine='backtrack'):
+        """Return pattern compiled for matching `engine`, see `engines`."""
+        if engine not in self._matchers:
+            if engine not in engines:
+                raise ValueError('unknown matching engine %r' % engine)
+            self._matchers[engine] = engines[engine](self.pattern)
+        return self._matchers[engine]
+
+    def complete(self, argv):
+        """Return commands, arguments and options that may follow `argv`.
+
+        Arguments stand for any value; options are those of `options`.  If
+        `argv` ends with an option that takes an argument, only its argument
+        may follow, so just that option is returned.  Wrong `argv` raises
+        `DocoptExit`.
+
+        """
+        if '_completer' not in self.__dict__:
+            from docopt_nfa import Completer
+            object.__setattr__(self, '_completer',
+                               Completer(self.pattern, self.options))
+        klass = type(argv).__name__
+        argv = argv.split() if klass in ('str', 'unicode') else list(argv)
+        try:
+            tokens = parse_args(argv, self.options)
+        except DocoptExit:
+            try:  # is it only the argument of the last option that's missing?
+                last = parse_args(argv + ['\0'], self.options)[-1]
+            except DocoptExit:
+                last = None
+            if type(last) is not Option or last.value != '\0':
+                raise
+            return [o for o in self.options
+                    if (o.short, o.long) == (last.short, last.long)]
+        return self._completer.complete(tokens)
+
+    def parse(self, argv=None, help=True, version=None, engine='backtrack',
+              response_files=False, stdin=None):
+        profiling = _profile
+        if profiling:
+            profiling.lap()
+        DocoptExit.usage = self.usage
+        if stdin is not None and not [a for a in self.arguments
+                                      if a.name == stdin and
+                                      type(a.value) is list]:
+            raise DocoptLanguageError('%s is not a list argument' % stdin)
+        argv = sys.argv[1:] if argv is None else argv
+        try:  # DocoptExit.usage may be another parser's, set by another thread
+            argv = parse_args(expand_args(argv) if response_files else argv,
+                              options=self.options)
+        except DocoptExit:
+            raise DocoptExit(sys.exc_info()[1].reason, self.usage)
+        extras(help, version, argv, self.doc)
+        if profiling:
+            profiling.lap('tokens')
+        matched, left, arguments = self.matcher(engine).match(argv)
+        if profiling:
+            profiling.lap('match')
+        if matched and left == []:  # better message if left?
+            options = [o for o in argv if type(o) is Option]
+            # list defaults are copied so callers can't alter the pattern
+            result = Dict((a.name, list(a.value) if type(a.value) is list
+                           else a.value) for a in
+                          (self.options + options + self.arguments +
+                           arguments))
+            if stdin is not None and '-' in result[stdin]:
+                values = []
+                for value in result[stdin]:
+                    if value == '-':
+                        values.extend(read_lines(sys.stdin))
+                    else:
+                        values.append(value)
+                result[stdin] = values
+            if profiling:
+                profiling.lap('result')
+            return result
+        raise DocoptExit(usage=self.usage)
+
+    def __reduce__(self):
+        return _unpickle_parser, (self._encode(),)
+
+    def _encode(self):
+        """Return pattern and options as nested tuples, fit for `marshal`."""
+        leaves, index = [], {}
+
+        def encode(pattern):
+            if hasattr(pattern, 'children'):
+                return (type(pattern).__name__,) + tuple(
+                        encode(c) for c in pattern.children)
+            if id(pattern) not in index:  # keep identities set up by fix()
+                index[id(pattern)] = len(leaves)
+                leaves.append(_encode_leaf(pattern))
+            return index[id(pattern)]
+
+        tree = encode(self.pattern)
+        return (self.doc, self.usage,
+                tuple(_encode_leaf(o) for o in self.options),
+                tuple(leaves), tree)
+
+    @classmethod
+    def _decode(class_, data):
+        doc, usage, options, leaves, tree = data
+        leaves = [_decode_leaf(l) for l in leaves]
+
+        def decode(node):
+            if type(node) is int:
+                return leaves[node]
+            return _patterns[node[0]](*[decode(c) for c in node[1:]])
+
+        parser = class_.__new__(class_)
+        parser._freeze(doc, usage,
+                       OptionTable(_decode_leaf(o) for o in options),
+                       decode(tree))
+        return parser
+
+
+def _unpickle_parser(data):
+    return Parser._decode(data)
+
+
+def _encode_leaf(leaf):
+    if type(leaf) is Option:
+        return ('Option', leaf.short, leaf.long, leaf.argcount, leaf.value)
+    return (type(leaf).__name__, leaf.name, leaf.value)
+
+
+def _decode_leaf(data):
+    return _patterns[data[0]](*data[1:])
+
+
+_patterns = dict((c.__name__, c) for c in (Argument, Command, Option,
+                 AnyOptions, Required, Optional, OneOrMore, Either))
+
+_CACHE_FORMAT = 1
+
+
+def compile(doc, cache=False):
+    """Compile usage message `doc` into a reusable `Parser`.
+
+    If `cache` is set, the compiled parser is also saved on disk and loaded
+    from there by later processes: into directory `cache`, or, if it is
+    `True`, into `$XDG_CACHE_HOME/docopt` (`~/.cache/docopt` by default).
+
+    """
+    if not cache:
+        return Parser(doc)
+    import hashlib
+    if cache is True:
+        cache = os.path.join(os.environ.get('XDG_CACHE_HOME') or
+                             os.path.join(os.path.expanduser('~'), '.cache'),
+                             'docopt')
+    key = '%d\0%s\0%d.%d\0%s' % ((_CACHE_FORMAT, __version__) +
+                                  tuple(sys.version_info[:2]) + (doc,))
+    try:
+        key = key.encode('utf-8')
+    except UnicodeError:
+        pass
+    path = os.path.join(cache, hashlib.sha1(key).hexdigest() + '.docopt')
+    parser = _load_parser(path, doc)
+    if parser is None:
+        parser = Parser(doc)
+        _save_parser(path, parser)
+    return parser
+
+
+def _load_parser(path, doc):
+    import marshal
+    try:
+        f = open(path, 'rb')
+        try:
+            data = marshal.load(f)
+        finally:
+            f.close()
+        if data[:2] != (_CACHE_FORMAT, __version__) or data[2] != doc:
+            return None
+        return Parser._decode(data[2:])
+    except Exception:  # missing, stale or corrupt file: compile anew
+        return None
+
+
+def _save_parser(path, parser):
+    """Write cache file atomically, so readers never see a partial file."""
+    import marshal
+    import tempfile
+    directory, tmp = os.path.dirname(path), None
+    try:
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        fd, tmp = tempfile.mkstemp(dir=directory)
+        f = os.fdopen(fd, 'wb')
+        try:
+            marshal.dump((_CACHE_FORMAT, __version__) + parser._encode(), f)
+        finally:
+            f.close()
+        os.rename(tmp, path)
+    except (IOError, OSError):  # cache is best-effort
+        if tmp is not None and os.path.exists(tmp):
+            os.remove(tmp)
+
+
+class _LRUCache(object):
+
+    """Mapping of bounded size that evicts least recently used entries.
+
+    Safe to share between threads: even a lookup relinks the list.  Of
+    size 0 or less, it keeps nothing.
+
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.links = {}
+        self.root = root = []  # circular list of [prev, next, key, value]
+        root[:] = [root, root, None, None]
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.links)
+
+    def __contains__(self, key):
+        return key in self.links
+
+    def get(self, key, default=None):
+        self.lock.acquire()
+        try:
+            link = self.links.get(key)
+            if link is None:
+                return default
+            self._unlink(link)
+            self._append(link)
+            return link[3]
+        finally:
+            self.lock.release()
+
+    def __setitem__(self, key, value):
+        if self.size <= 0:
+            return
+        self.lock.acquire()
+        try:
+            link = self.links.get(key)
+            if link is not None:
+                self._unlink(link)
+            elif len(self.links) >= self.size:
+                oldest = self.root[1]
+                self._unlink(oldest)
+                del self.links[oldest[2]]
+            link = self.links[key] = [None, None, key, value]
+            self._append(link)
+        finally:
+            self.lock.release()
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            self.links.clear()
+            self.root[:] = [self.root, self.root, None, None]
+        finally:
+            self.lock.release()
+
+    def _unlink(self, link):
+        prev, next = link[0], link[1]
+        prev[1], next[0] = next, prev
+
+    def _append(self, link):
+        last = self.root[0]
+        link[0], link[1] = last, self.root
+        last[1] = self.root[0] = link
+
+
+_parsers = _LRUCache(64)
+
+
+def docopt(doc, argv=sys.argv[1:], help=True, version=None, cache=False,
+           engine='backtrack', response_files=False, stdin=None):
+    parser = _parsers.get(doc)
+    if parser is None:
+        parser = _parsers[doc] = compile(doc, cache)
+    DocoptExit.usage = docopt.usage = parser.usage
+    return parser.parse(argv, help, version, engine, response_files, stdin)
+
+
+_profile = None
+_clock = getattr(time, 'perf_counter', time.time)
+_blocks = getattr(sys, 'getallocatedblocks', lambda: 0)  # Python 3.4+
+
+
+class Profile(object):
+
+    """Wall time and allocations of each phase of parsing, summed over all
+    calls made while profiling.
+
+    Phases are "usage", "options", "pattern" and "fix" of `compile`, then
+    "tokens", "match" and "result" of `Parser.parse`.  Compiled parsers are
+    cached by `docopt`, so repeated calls record only the latter.
+    Allocations are the net number of memory blocks allocated (0 before
+    Python 3.4).  Profiles nest: phases recorded by an inner profile are
+    recorded by the enclosing ones too.  Profiling from several threads at
+    once mixes up phases.
+
+    With `memory`, memory is traced by `tracemalloc` (Python 3.4+), which
+    slows everything down, and each phase also records its `peak`, the
+    most bytes it had allocated at once in any call, and `allocated`, net
+    bytes allocated in all calls.  Before Python 3.9, peaks of phases
+    include those of earlier phases of the same call.
+
+    """
+
+    phases = ('usage', 'options', 'pattern', 'fix', 'tokens', 'match',
+              'result')
+
+    def __init__(self, memory=False):
+        self.calls = dict((phase, 0) for phase in self.phases)
+        self.seconds = dict((phase, 0.0) for phase in self.phases)
+        self.blocks = dict((phase, 0) for phase in self.phases)
+        self.memory = memory
+        self.peak = dict((phase, 0) for phase in self.phases)
+        self.allocated = dict((phase, 0) for phase in self.phases)
+        self._outer, self._tracemalloc, self._started = None, None, False
+
+    def __enter__(self):
+        global _profile
+        if self.memory:
+            import tracemalloc
+            self._tracemalloc = tracemalloc
+            self._started = not tracemalloc.is_tracing()
+            if self._started:
+                tracemalloc.start()
+        self._outer, _profile = _profile, self
+        self.lap()
+        return self
+
+    def __exit__(self, *exc_info):
+        global _profile
+        _profile = self._outer
+        if self._started:
+            self._tracemalloc.stop()
+            self._started = False
+
+    def lap(self, phase=None):
+        """Record time and allocations since last lap as those of `phase`,
+        in this and enclosing profiles."""
+        tracing = self._tracemalloc
+        if phase is not None:
+            self.calls[phase] += 1
+            self.seconds[phase] += _clock() - self._start
+            self.blocks[phase] += _blocks() - self._allocated
+            if tracing:
+                current, peak = tracing.get_traced_memory()
+                self.peak[phase] = max(self.peak[phase], peak - self._traced)
+                self.allocated[phase] += current - self._traced
+        if self._outer is not None:  # before the peak is reset below
+            self._outer.lap(phase)
+        if tracing:
+            if hasattr(tracing, 'reset_peak'):  # Python 3.9+
+                tracing.reset_peak()
+            self._traced = tracing.get_traced_memory()[0]
+        self._allocated, self._start = _blocks(), _clock()
+
+    def report(self):
+        """Return table of phases with calls, time and allocations."""
+        memory = self.memory and ' %10s %10s' % ('peak, KiB', 'net, KiB')
+        lines = ['%-8s %8s %12s %12s %10s%s' % (
+                'phase', 'calls', 'total, ms', 'per call, us', 'blocks',
+                memory or '')]
+        for phase in self.phases:
+            calls, seconds = self.calls[phase], self.seconds[phase]
+            lines.append('%-8s %8d %12.3f %12.1f %10d%s' % (
+                    phase, calls, seconds * 1e3,
+                    seconds / calls * 1e6 if calls else 0, self.blocks[phase],
+                    memory and ' %10.1f %10.1f' % (
+                            self.peak[phase] / 1024.0,
+                            self.allocated[phase] / 1024.0) or ''))
+        return '\n'.join(lines)
+
+
+def profile(memory=False):
+    """Return context manager that profiles parsing within it, see `Profile`.
+
+    >>> with profile() as p:
+    ...     arguments = docopt(doc)
+    >>> print(p.report())
+
+    """
+    return Profile(memory)
+
+
+class Counters(object):
+
+    """Deterministic counts of the work of parsing, made while counting.
+
+    Unlike times, counts don't vary from run to run, so they can be checked
+    against counts known for given usages and argvs to catch regressions
+    (see language_agnostic_test/operation_counts.py).  Counted are
+
+      visits      calls of `_match` of patterns (by the backtracking engine)
+      backtracks  matches thrown away: of failed `Required` sequences, and
+                  of alternatives of `Either` other than the one taken
+      copies      entries copied into new lists: positional arguments of
+                  argv, tokens left, results collected, and entries of the
+                  alternative taken, which `Either` sets aside
+      lookups     lookups of options in `OptionTable`, and of kinds of
+                  options in argv
+      tokens      tokens consumed by tokenizers
+
+    Counting replaces the methods that do these with counting ones for its
+    duration, so that it costs nothing when off; calls from all threads are
+    counted.  Compiled parsers are cached by `docopt`, so count calls of
+    `Parser.parse` to get the same counts every time.
+
+    """
+
+    names = ('visits', 'backtracks', 'copies', 'lookups', 'tokens')
+
+    def __init__(self):
+        self.counts = dict((name, 0) for name in self.names)
+        self._saved = []
+
+    def __enter__(self):
+        counts, self._saved = self.counts, []
+
+        def matcher(class_, match):
+            def _match(self, argv, p, m, log):
+                counts['visits'] += 1
+                n = len(log)
+                matched, p, m = match(self, argv, p, m, log)
+                if class_ is Either:
+                    counts['backtracks'] += len(self.children) - matched
+                    counts['copies'] += len(log) - n
+                elif class_ is Required and not matched:
+                    counts['backtracks'] += 1
+                return matched, p, m
+            return _match
+
+        def counter(name, method, copied=None):
+            def counted(self, *args):
+                result = method(self, *args)
+                counts[name] += 1 if copied is None else \
+                                len(copied(self, result))
+                return result
+            return counted
+
+        for class_ in (Argument, Command, Option, AnyOptions, Required,
+                       Optional, OneOrMore, Either):
+            self._replace(class_, '_match', lambda m, c=class_: matcher(c, m))
+        self._replace(Argv, '__init__', lambda m: counter(
+                'copies', m, lambda self, result: self.args))
+        for name in ('left', 'collect'):
+            self._replace(Argv, name, lambda m: counter(
+                    'copies', m, lambda self, result: result))
+        for class_, name in ((Argv, 'bit'), (OptionTable, 'long'),
+                             (OptionTable, 'short')):
+            self._replace(class_, name, lambda m: counter('lookups', m))
+        self._replace(TokenStream, 'move', lambda m: counter('tokens', m))
+        return self
+
+    def __exit__(self, *exc_info):
+        for class_, name, method in reversed(self._saved):
+            setattr(class_, name, method)
+        self._saved = []
+
+    def _replace(self, class_, name, wrap):
+        method = class_.__dict__[name]
+        self._saved.append((class_, name, method))
+        setattr(class_, name, wrap(method))
+
+
+def count():
+    """Return context manager that counts work of parsing, see `Counters`.
+
+    >>> with count() as c:
+    ...     arguments = parser.parse(argv)
+    >>> c.counts['visits']
+
+    """
+    return Counters()
+
+
+class ParseFailure(object):
+
+    """Argv that doesn't match usage, with `reason` as in `DocoptExit`."""
+
+    def __init__(self, argv, reason=''):
+        self.argv, self.reason = argv, reason
+
+    def __eq__(self, other):
+        return type(self) is type(other) and \
+               (self.argv, self.reason) == (other.argv, other.reason)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'ParseFailure(%r, %r)' % (self.argv, self.reason)
+
+
+class Batch(list):
+
+    """Results of `docopt_many`, a `Dict` or `ParseFailure` per argv."""
+
+    def __init__(self, results, elapsed=0.0, hits=0, indexes=None):
+        list.__init__(self, results)
+        self.elapsed, self.hits, self.indexes = elapsed, hits, indexes
+
+    @property
+    def failures(self):
+        return [r for r in self if type(r) is ParseFailure]
+
+    @property
+    def throughput(self):
+        """Number of argvs parsed per second."""
+        return len(self) / self.elapsed if self.elapsed else float('inf')
+
+
+class BitColumn(object):
+
+    """Column of booleans, packed 8 to a byte."""
+
+    def __init__(self):
+        self.bits, self.size = array('B'), 0
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        return bool(self.bits[i >> 3] & 1 << (i & 7))
+
+    def append(self, value):
+        if not self.size & 7:
+            self.bits.append(0)
+        if value:
+            self.bits[-1] |= 1 << (self.size & 7)
+        self.size += 1
+
+    def to_numpy(self):
+        import numpy
+        return numpy.unpackbits(numpy.frombuffer(self.bits, numpy.uint8),
+                                count=self.size, bitorder='little') \
+                    .astype(bool)
+
+
+class StringColumn(object):
+
+    """Column of strings or None, as codes into a list of distinct `values`.
+
+    Code of None is -1.
+
+    """
+
+    def __init__(self):
+        self.codes, self.values, self.index = array('l'), [], {}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        code = self.codes[i]
+        return None if code < 0 else self.values[code]
+
+    def code(self, value):
+        if value is None:
+            return -1
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def append(self, value):
+        self.codes.append(self.code(value))
+
+    def to_numpy(self):
+        """Return array of codes, see `values` for strings they stand for."""
+        import numpy
+        return numpy.asarray(self.codes)
+
+
+class ListColumn(StringColumn):
+
+    """Column of lists of strings, with `codes` of all lists end to end.
+
+    List `i` is `codes[offsets[i]:offsets[i + 1]]`.
+
+    """
+
+    def __init__(self):
+        StringColumn.__init__(self)
+        self.offsets = array('l', [0])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return [self.values[c]
+                for c in self.codes[self.offsets[i]:self.offsets[i + 1]]]
+
+    def append(self, value):
+        self.codes.extend([self.code(v) for v in value])
+        self.offsets.append(len(self.codes))
+
+    def to_numpy(self):
+        """Return arrays of offsets and of codes."""
+        import numpy
+        return numpy.asarray(self.offsets), numpy.asarray(self.codes)
+
+
+class Columns(object):
+
+    """Results of `docopt_many(..., columns=True)`, a column per name.
+
+    Options without argument and commands are stored in a `BitColumn`,
+    other options and arguments in a `StringColumn`, list arguments in a
+    `ListColumn`.  `failures` holds the reason of each failed argv, and None
+    for the others, whose row is left at defaults.
+
+    """
+
+    elapsed, hits, indexes = 0.0, 0, None
+    throughput = Batch.throughput
+
+    def __init__(self, parser):
+        self.columns = {}
+        for o in parser.options:
+            self.columns[o.name] = StringColumn() if o.argcount \
+                                   else BitColumn()
+        for a in parser.arguments:
+            self.columns[a.name] = (BitColumn() if type(a) is Command else
+                                    ListColumn() if type(a.value) is list
+                                    else StringColumn())
+        self.failures = StringColumn()
+        self.defaults = dict((name, [] if type(column) is ListColumn
+                              else None)
+                             for name, column in self.columns.items())
+
+    def __len__(self):
+        return len(self.failures)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def names(self):
+        return sorted(self.columns)
+
+    def append(self, result):
+        if type(result) is ParseFailure:
+            self.failures.append(result.reason)
+            result = self.defaults
+        else:
+            self.failures.append(None)
+        for name, column in self.columns.items():
+            column.append(result[name])
+
+    def row(self, i):
+        """Return result of argv `i`, with argv of `ParseFailure` unknown."""
+        if self.failures[i] is not None:
+            return ParseFailure(None, self.failures[i])
+        return Dict((name, column[i]) for name, column in self.columns.items())
+
+
+def docopt_many(doc, argvs, engine='backtrack', size=1024, processes=None,
+                ordered=True, chunksize=1000, columns=False):
+    """Parse every argv of `argvs` according to `doc`, return a `Batch`.
+
+    Argvs that don't match are returned as `ParseFailure`, and help and
+    version options are not acted upon.  Results of the `size` most
+    recently parsed distinct argvs are reused, so equal argvs share one
+    result object; `size=0` turns that off.
+
+    With `processes`, argvs are parsed in chunks of `chunksize` by a pool of
+    that many worker processes (all cores if it is 0), each of which gets
+    the compiled parser once.  If `ordered` is false, results are listed as
+    chunks complete, and `Batch.indexes` gives the index in `argvs` of each.
+
+    With `columns`, results are stored in `Columns` instead of a `Batch`.
+
+    """
+    parser = _parsers.get(doc)
+    if parser is None:
+        parser = _parsers[doc] = compile(doc)
+    results = Columns(parser) if columns else []
+    indexes, hits, start = [], 0, time.time()
+    for first, chunk, chunk_hits in _parse_chunks(
+            _ChunkParser(parser, engine, size), argvs, processes,
+            ordered, chunksize):
+        for result in chunk:
+            results.append(result)
+        if not ordered:
+            indexes.extend(range(first, first + len(chunk)))
+        hits += chunk_hits
+    if not columns:
+        results = Batch(results)
+    results.elapsed, results.hits = time.time() - start, hits
+    results.indexes = None if ordered else indexes
+    return results
+
+
+def stream(doc, lines, engine='backtrack'):
+    """Parse each line of `lines` according to `doc`, yield its result.
+
+    Lines are split into argv by shell quoting rules (see `shlex.split`).
+    Like `docopt_many`, yields `ParseFailure` for lines that don't match and
+    doesn't act upon help and version options.
+
+    """
+    import shlex
+    parser = _parsers.get(doc)
+    if parser is None:
+        parser = _parsers[doc] = compile(doc)
+    for line in lines:
+        try:
+            if '"' in line or "'" in line or '\\' in line:
+                argv = shlex.split(line)
+            else:  # nothing to unquote
+                argv = line.split()
+            yield parser.parse(argv, False, None, engine)
+        except DocoptExit:
+            yield ParseFailure(line, sys.exc_info()[1].reason)
+        except ValueError:  # unbalanced quotes
+            yield ParseFailure(line, str(sys.exc_info()[1]))
+
+
+class _ChunkParser(object):
+
+    """Parse chunks of argvs, reusing results of equal argvs."""
+
+    def __init__(self, parser, engine, size):
+        self.parser, self.engine, self.size = parser, engine, size
+        self.cache = _LRUCache(size)
+
+    def __getstate__(self):
+        return self.parser, self.engine, self.size
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def __call__(self, chunk):
+        """Return (first, results, hits) for chunk (first, argvs)."""
+        first, argvs = chunk
+        results, hits, cache = [], 0, self.cache
+        for argv in argvs:
+            key = tuple(argv.split() if type(argv).__name__ in ('str',
+                                                               'unicode')
+                        else argv)
+            result = cache.get(key)
+            if result is None:
+                try:
+                    result = self.parser.parse(argv, False, None, self.engine)
+                except DocoptExit:
+                    result = ParseFailure(argv, sys.exc_info()[1].reason)
+                cache[key] = result
+            else:
+                hits += 1
+            results.append(result)
+        return first, results, hits
+
+
+def _parse_chunks(work, argvs, processes=None, ordered=True, chunksize=1000):
+    """Yield outcomes of `work` on chunks of argvs, see `docopt_many`."""
+    argvs = iter(argvs)
+
+    def chunks():
+        first = 0
+        while True:
+            chunk = list(islice(argvs, chunksize))
+            if not chunk:
+                return
+            yield first, chunk
+            first += len(chunk)
+
+    if processes is None:
+        for chunk in chunks():
+            yield work(chunk)
+        return
+    import multiprocessing
+    pool = multiprocessing.Pool(processes or None, _start_worker, (work,))
+    try:
+        for outcome in (pool.imap if ordered else pool.imap_unordered)(
+                _work, chunks()):
+            yield outcome
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+_worker = None
+
+
+def _start_worker(work):
+    global _worker
+    _worker = work
+
+
+def _work(chunk):
+    return _worker(chunk)
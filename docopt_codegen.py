@@ -0,0 +1,460 @@
+"""Compile a usage message into a specialized Python matcher module.
+
+Usage:
+  docopt_codegen.py [-o FILE] <source>
+  docopt_codegen.py --completion=<shell> [--name=<prog>] [-o FILE] <source>
+  docopt_codegen.py --check [<tester>]
+
+Options:
+  -o FILE               Write the generated module or script to FILE instead
+                        of standard output.
+  --completion=<shell>  Generate completion script for bash, zsh or fish.
+  --name=<prog>         Name of command to complete, by default that of
+                        the program in usage.
+  --check               Compare generated matchers with `docopt` on every
+                        case of the language-agnostic test suite in <tester>
+                        (by default, the one bundled in
+                        language_agnostic_test/).
+
+The generated module defines `docopt(argv=None, help=True, version=None)`,
+which returns the same dictionary as `docopt.docopt(__doc__, argv, ...)`.
+Usage pattern is turned into straight-line functions, one per group of
+the pattern, that match positional arguments by index and options by a
+bit mask, so no pattern tree is walked or copied at run time.
+
+Completion scripts need no Python at run time: they walk a table of
+states of `docopt_nfa.Completer`, precomputed for every sequence of
+commands and other positional words.  Options are offered wherever the
+usage allows them, but skipped when the script reads words typed so far.
+
+"""
+import os
+import sys
+
+from docopt import (docopt, compile, DocoptExit, Option, Argument, Command,
+                    AnyOptions)
+from docopt_nfa import Completer, ARGUMENT, COMMAND
+
+
+def is_leaf(p):
+    return type(p) is AnyOptions or not hasattr(p, 'children')
+
+
+def unique(items):
+    seen = set()
+    return [i for i in items if not (i in seen or seen.add(i))]
+
+
+class Generator(object):
+
+    def __init__(self, doc):
+        self.parser = compile(doc)
+        self.bits = {}
+        for o in self.parser.options:
+            self.bits.setdefault((o.short, o.long), len(self.bits))
+        self.functions = []
+
+    def leaf(self, p):
+        """Return (test, actions) that match leaf `p` at state P, M, C."""
+        if type(p) is Argument:
+            return 'P < len(a)', ['C = (C, %r, a[P])' % p.name, 'P += 1']
+        if type(p) is Command:
+            return ('P < len(a) and a[P] == %r' % p.name,
+                    ['C = (C, %r, True)' % p.name, 'P += 1'])
+        if type(p) is Option:
+            bit = 1 << self.bits[p.short, p.long]
+            return 'M & %d' % bit, ['M ^= %d' % bit]
+        if type(p) is AnyOptions:
+            return 'M', ['M = 0']
+
+    def function(self, p):
+        """Emit matcher function for group `p`, return its name."""
+        name = '_match%d' % len(self.functions)
+        self.functions.append(None)
+        body = getattr(self, type(p).__name__.lower())(p)
+        self.functions[int(name[6:])] = '\n    '.join(
+                ['def %s(a, w, p, m, c):' % name, 'P, M, C = p, m, c'] + body)
+        return name
+
+    def call(self, p):
+        return 'ok, P, M, C = %s(a, w, P, M, C)' % self.function(p)
+
+    def required(self, p):
+        body = []
+        for c in p.children:
+            if not is_leaf(c):
+                body += [self.call(c), 'if not ok:',
+                         '    return False, p, m, c']
+            else:
+                test, actions = self.leaf(c)
+                body += ['if not (%s):' % test, '    return False, p, m, c']
+                body += actions
+        return body + ['return True, P, M, C']
+
+    def optional(self, p):
+        body = []
+        for c in p.children:
+            if not is_leaf(c):
+                body.append(self.call(c))
+            else:
+                test, actions = self.leaf(c)
+                body += ['if %s:' % test] + ['    ' + s for s in actions]
+        return body + ['return True, P, M, C']
+
+    def oneormore(self, p):
+        [c] = p.children
+        if not is_leaf(c):
+            step = ['ok, P1, M1, C = %s(a, w, P, M, C)' % self.function(c),
+                    'if not ok:', '    break', 'times += 1',
+                    'if P1 == P and M1 == M:', '    break', 'P, M = P1, M1']
+        else:
+            test, actions = self.leaf(c)
+            step = ['if not (%s):' % test, '    break', 'times += 1'] + actions
+        return (['times = 0', 'while True:'] + ['    ' + s for s in step] +
+                ['if times:', '    return True, P, M, C',
+                 'return False, p, m, c'])
+
+    def either(self, p):
+        body = ['best = None']
+        for c in p.children:
+            if not is_leaf(c):
+                body += ['ok, P, M, C = %s(a, w, p, m, c)' % self.function(c),
+                         'if ok:']
+            else:
+                test, actions = self.leaf(c)
+                body += ['P, M, C = p, m, c', 'if %s:' % test]
+                body += ['    ' + s for s in actions]
+            body += ['    size = _size(a, w, P, M)',
+                     '    if best is None or size < best[0]:',
+                     '        best = size, P, M, C']
+        return body + ['if best is None:', '    return False, p, m, c',
+                       'return True, best[1], best[2], best[3]']
+
+    def module(self):
+        parser = self.parser
+        top = self.function(parser.pattern)
+        arguments = unique((a.name, a.value) for a in parser.arguments
+                           if type(a.value) is not list)
+        lists = unique(a.name for a in parser.arguments
+                       if type(a.value) is list)
+        return '\n'.join([
+            '"""Matcher generated by docopt_codegen from usage message:',
+            '',
+            parser.usage.replace('\\', '\\\\').replace('"""', '\\"\\"\\"'),
+            '',
+            '"""',
+            'import sys',
+            '',
+            'from docopt import (DocoptExit, Dict, Option, OptionTable,',
+            '                    parse_args, extras)',
+            '',
+            '',
+            'doc = %r' % parser.doc,
+            'usage = %r' % parser.usage,
+            'options = OptionTable([%s])' % ',\n                       '.join(
+                    repr(o) for o in parser.options),
+            'bits = %r' % self.bits,
+            'option_defaults = %r' % [(o.name, o.value)
+                                      for o in parser.options],
+            'argument_defaults = %r' % arguments,
+            'lists = set(%r)' % lists,
+            '',
+            '',
+            'def _size(a, w, p, m):',
+            '    """Number of tokens left unmatched."""',
+            '    size, i = len(a) - p, 0',
+            '    while m:',
+            '        if m & 1:',
+            '            size += w[i]',
+            '        m, i = m >> 1, i + 1',
+            '    return size',
+            '',
+            ''] +
+            [f + '\n\n' for f in self.functions] + [
+            'def docopt(argv=None, help=True, version=None):',
+            '    DocoptExit.usage = usage',
+            '    argv = parse_args(sys.argv[1:] if argv is None else argv,',
+            '                      options=options)',
+            '    extras(help, version, argv, doc)',
+            '    a, w, m = [], [0] * %d, 0' % len(self.bits),
+            '    for token in argv:',
+            '        if type(token) is Option:',
+            '            bit = bits[token.short, token.long]',
+            '            w[bit] += 1',
+            '            m |= 1 << bit',
+            '        else:',
+            '            a.append(token.value)',
+            '    ok, p, m, c = %s(a, w, 0, m, None)' % top,
+            '    if not ok or p < len(a) or m:',
+            '        raise DocoptExit()',
+            '    result = Dict(option_defaults)',
+            '    for token in argv:',
+            '        if type(token) is Option:',
+            '            result[token.name] = token.value',
+            '    result.update(argument_defaults)',
+            '    for name in lists:',
+            '        result[name] = []',
+            '    collected = []',
+            '    while c is not None:',
+            '        c, name, value = c',
+            '        collected.append((name, value))',
+            '    for name, value in reversed(collected):',
+            '        if name in lists:',
+            '            result[name].append(value)',
+            '        else:',
+            '            result[name] = value',
+            '    return result',
+            ''])
+
+
+class Completion(object):
+
+    """Completer states reachable by positional words, tabulated.
+
+    Words that name no command of the pattern all lead to the same state,
+    so each state has `transitions` for commands, and a `default` for all
+    other words.  Dead state, where no word is valid, is -1.
+
+    """
+
+    def __init__(self, doc, name=None, max_states=10000):
+        parser = compile(doc)
+        self.name = name or parser.usage.split()[1]
+        completer = Completer(parser.pattern, parser.options)
+        commands = sorted(set(op[1].name for op in completer.program
+                              if op[0] == COMMAND))
+        self.takes_argument = [n for o in parser.options if o.argcount
+                               for n in (o.short, o.long) if n]
+        states, index = [completer.state([])], {}
+        index[states[0][0]] = 0
+        self.transitions, self.default, self.words, self.files = [], [], [], []
+        for state in states:  # grows while new states are found
+            targets = []
+            for word in commands + [None]:
+                threads = completer.step(state, Argument(None, word))[0]
+                if threads and threads not in index:
+                    if len(states) >= max_states:
+                        raise ValueError('usage needs more than %d states' %
+                                         max_states)
+                    index[threads] = len(states)
+                    states.append((threads, 0))
+                targets.append(index[threads] if threads else -1)
+            default = targets.pop()
+            self.default.append(default)
+            self.transitions.append([(w, t) for w, t in zip(commands, targets)
+                                     if t != default])
+            words, options = [], 0
+            for pc, m, s in state[0]:
+                op = completer.program[pc]
+                if op[0] == COMMAND and op[1].name not in words:
+                    words.append(op[1].name)
+                options |= s | completer.reach[pc]
+            self.files.append(any(completer.program[pc][0] == ARGUMENT
+                                  for pc, _, _ in state[0]))
+            self.words.append(words + [n for i, o in
+                                       enumerate(completer.options)
+                                       if options & 1 << i
+                                       for n in (o.short, o.long) if n])
+
+    def function(self):
+        return '_%s_docopt' % ''.join(c if c.isalnum() else '_'
+                                      for c in self.name)
+
+    def bash(self):
+        q = lambda s: "'%s'" % s.replace("'", "'\\''")
+        lines = ['# bash completion for %s, generated by docopt_codegen' %
+                 self.name, '',
+                 '%s() {' % self.function(),
+                 '    local i=1 state=0 word words',
+                 '    while [ $i -lt $COMP_CWORD ]; do',
+                 '        word=${COMP_WORDS[i]}',
+                 '        i=$((i + 1))',
+                 '        case $word in']
+        if self.takes_argument:
+            lines.append('            %s) i=$((i + 1)); continue ;;' %
+                         '|'.join(map(q, self.takes_argument)))
+        lines += ['            -?*) continue ;;', '        esac',
+                  '        case $state,$word in']
+        for i, (transitions, default) in enumerate(zip(self.transitions,
+                                                       self.default)):
+            for word, target in transitions:
+                lines.append('            %s) state=%d ;;' %
+                             (q('%d,%s' % (i, word)), target))
+            lines.append("            %d,*) state=%d ;;" % (i, default))
+        lines += ['        esac', '    done', '    case $state in']
+        for i, words in enumerate(self.words):
+            lines.append('        %d) words=%s ;;' % (i, q(' '.join(words))))
+        lines += ['        *) words= ;;', '    esac',
+                  '    COMPREPLY=($(compgen -W "$words" -- '
+                  '"${COMP_WORDS[COMP_CWORD]}"))']
+        files = [str(i) for i, f in enumerate(self.files) if f]
+        if files:
+            lines += ['    case $state in',
+                      '        %s) COMPREPLY+=($(compgen -f -- '
+                      '"${COMP_WORDS[COMP_CWORD]}")) ;;' % '|'.join(files),
+                      '    esac']
+        return '\n'.join(lines + ['}', '',
+                                  'complete -F %s %s' % (self.function(),
+                                                         q(self.name)), ''])
+
+    def zsh(self):
+        q = lambda s: "'%s'" % s.replace("'", "'\\''")
+        lines = ['#compdef %s' % self.name,
+                 '# zsh completion for %s, generated by docopt_codegen' %
+                 self.name, '',
+                 '%s() {' % self.function(),
+                 '    local i=2 state=0 word',
+                 '    while (( i < CURRENT )); do',
+                 '        word=${words[i]}',
+                 '        (( i++ ))',
+                 '        case $word in']
+        if self.takes_argument:
+            lines.append('            (%s) (( i++ )); continue ;;' %
+                         '|'.join(map(q, self.takes_argument)))
+        lines += ['            (-?*) continue ;;', '        esac',
+                  '        case "$state,$word" in']
+        for i, (transitions, default) in enumerate(zip(self.transitions,
+                                                       self.default)):
+            for word, target in transitions:
+                lines.append('            (%s) state=%d ;;' %
+                             (q('%d,%s' % (i, word)), target))
+            lines.append("            (%d,*) state=%d ;;" % (i, default))
+        lines += ['        esac', '    done', '    case $state in']
+        for i, (words, files) in enumerate(zip(self.words, self.files)):
+            action = ['compadd -- %s' % ' '.join(map(q, words))] if words \
+                     else []
+            action += ['_files'] if files else []
+            if action:
+                lines.append('        (%d) %s ;;' % (i, '; '.join(action)))
+        return '\n'.join(lines + ['    esac', '}', '',
+                                  'compdef %s %s' % (self.function(),
+                                                     q(self.name)), ''])
+
+    def fish(self):
+        q = lambda s: "'%s'" % s.replace('\\', '\\\\').replace("'", "\\'")
+        lines = ['# fish completion for %s, generated by docopt_codegen' %
+                 self.name, '',
+                 'function %s' % self.function(),
+                 '    set -l tokens (commandline -opc)',
+                 '    set -l state 0',
+                 '    set -l i 2',
+                 '    while test $i -le (count $tokens)',
+                 '        set -l word $tokens[$i]',
+                 '        set i (math $i + 1)',
+                 '        switch $word']
+        if self.takes_argument:
+            lines += ['            case %s' % ' '.join(map(q,
+                                                       self.takes_argument)),
+                      '                set i (math $i + 1)',
+                      '                continue']
+        lines += ["            case '-?*'", '                continue',
+                  '        end', '        switch "$state,$word"']
+        for i, (transitions, default) in enumerate(zip(self.transitions,
+                                                       self.default)):
+            for word, target in transitions:
+                lines += ['            case %s' % q('%d,%s' % (i, word)),
+                          '                set state %d' % target]
+            lines += ["            case '%d,*'" % i,
+                      '                set state %d' % default]
+        lines += ['        end', '    end', '    switch $state']
+        for i, (words, files) in enumerate(zip(self.words, self.files)):
+            if words or files:
+                lines.append('        case %d' % i)
+            if words:
+                lines.append("            printf '%%s\\n' %s" %
+                             ' '.join(map(q, words)))
+            if files:
+                lines.append('            __fish_complete_path '
+                             '(commandline -ct)')
+        return '\n'.join(lines + ['    end', 'end', '',
+                                  "complete -c %s -f -a '(%s)'" %
+                                  (q(self.name), self.function()), ''])
+
+
+def completion(doc, shell, name=None):
+    """Return completion script for `shell` of program with usage `doc`."""
+    if shell not in ('bash', 'zsh', 'fish'):
+        raise ValueError('unknown shell %r' % shell)
+    return getattr(Completion(doc, name), shell)()
+
+
+def generate(doc):
+    """Return source of a module that parses argv according to `doc`."""
+    return Generator(doc).module()
+
+
+def load(doc):
+    """Generate matcher module for `doc` and return its namespace."""
+    namespace = {'__name__': 'docopt_generated'}
+    exec(generate(doc), namespace)
+    return namespace
+
+
+def check(tester):
+    """Return language-agnostic test cases where generated code differs."""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(tester)))
+    try:
+        name = os.path.splitext(os.path.basename(tester))[0]
+        fixtures = __import__(name).fixtures
+    finally:
+        sys.path.pop(0)
+    failures, modules = [], {}
+    for index, doc, argv, expect in fixtures():
+        if doc not in modules:
+            modules[doc] = load(doc)
+        outcomes = []
+        for parse in (lambda: docopt(doc, argv),
+                      lambda: modules[doc]['docopt'](argv)):
+            try:
+                outcomes.append(parse())
+            except DocoptExit:
+                outcomes.append('user-error')
+        if outcomes[0] != outcomes[1]:
+            failures.append((index, doc, argv, outcomes[0], outcomes[1]))
+    return failures
+
+
+def docstring(path):
+    """Return docstring of Python source file, without importing it."""
+    import ast
+    f = open(path)
+    try:
+        return ast.get_docstring(ast.parse(f.read()), clean=False)
+    finally:
+        f.close()
+
+
+def main(argv=None):
+    arguments = docopt(__doc__, sys.argv[1:] if argv is None else argv)
+    if arguments['--check']:
+        tester = arguments['<tester>'] or os.path.join(
+                os.path.dirname(os.path.abspath(__file__)),
+                'language_agnostic_test', 'language_agnostic_tester.py')
+        failures = check(tester)
+        for index, doc, argv, expected, result in failures:
+            print((' %d: MISMATCH ' % index).center(79, '='))
+            print('r"""%s"""\n$ prog %s' % (doc, argv))
+            print('docopt> %r\ngenerated> %r' % (expected, result))
+        if failures:
+            sys.exit(1)
+        return
+    doc = docstring(arguments['<source>'])
+    if doc is None:
+        sys.exit('%s has no docstring' % arguments['<source>'])
+    if arguments['--completion']:
+        source = completion(doc, arguments['--completion'],
+                            arguments['--name'])
+    else:
+        source = generate(doc)
+    if arguments['-o']:
+        f = open(arguments['-o'], 'w')
+        try:
+            f.write(source)
+        finally:
+            f.close()
+    else:
+        sys.stdout.write(source)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+"""Keep compiled usage messages warm in a daemon that parses argv over a
+Unix domain socket.
+
+Usage:
+  docopt_daemon.py serve [--socket=<path>]
+  docopt_daemon.py parse [--socket=<path>] <usage-file> [--] [<argv>...]
+
+Options:
+  --socket=<path>  Socket of daemon, by default $DOCOPT_SOCKET, or
+                   docopt.sock in $XDG_RUNTIME_DIR, or in a directory
+                   /tmp/docopt-<uid> private to the user.
+
+`parse` prints the parsed arguments as JSON, or the message `docopt` would
+print, and exits with the status `docopt` would exit with.
+
+Protocol is JSON, one object per line, over a connection that may carry any
+number of requests.  Request is
+
+    {"hash": <sha1 of usage message>, "argv": <list or string>,
+     "help": true, "version": null}
+
+and response is one of
+
+    {"result": <parsed arguments>}
+    {"output": <help or version>, "status": 0}
+    {"reason": <what is wrong>, "usage": <usage>, "status": 1}
+    {"unknown": true}                  daemon has no such usage message,
+                                       send request again with "doc"
+    {"error": <message>}               usage message is malformed
+
+"""
+from __future__ import with_statement
+import errno
+import hashlib
+import json
+import os
+import signal
+import socket
+import stat
+import sys
+
+try:
+    import socketserver
+except ImportError:  # Python 2
+    import SocketServer as socketserver
+
+from docopt import (docopt as _docopt, compile, parse_args, Dict, DocoptExit,
+                    DocoptLanguageError, _LRUCache)
+
+
+def default_socket():
+    if os.environ.get('DOCOPT_SOCKET'):
+        return os.environ['DOCOPT_SOCKET']
+    if os.environ.get('XDG_RUNTIME_DIR'):
+        return os.path.join(os.environ['XDG_RUNTIME_DIR'], 'docopt.sock')
+    # /tmp is shared, so that nobody else can put a socket in our place
+    return os.path.join(private_directory('/tmp/docopt-%d' % os.getuid()),
+                        'docopt.sock')
+
+
+def private_directory(path):
+    """Return `path` of directory that only the user can access, making it
+    if missing; raise `socket.error` if it is anything else."""
+    try:
+        os.mkdir(path, stat.S_IRWXU)
+    except OSError:
+        if sys.exc_info()[1].errno != errno.EEXIST:
+            raise socket.error(str(sys.exc_info()[1]))
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or \
+            info.st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+        raise socket.error('%s is not a private directory' % path)
+    return path
+
+
+def check_socket(path):
+    """Raise `socket.error` unless `path` is a socket owned by the user."""
+    try:
+        info = os.lstat(path)
+    except OSError:
+        raise socket.error(str(sys.exc_info()[1]))
+    if not stat.S_ISSOCK(info.st_mode) or info.st_uid != os.getuid():
+        raise socket.error('%s is not a socket of this user' % path)
+
+
+def digest(doc):
+    return hashlib.sha1(doc.encode('utf-8')).hexdigest()
+
+
+class Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            response = self.server.respond(json.loads(line.decode('utf-8')))
+            self.wfile.write((json.dumps(response) + '\n').encode('utf-8'))
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    """Daemon that keeps `size` most recently used parsers compiled."""
+
+    daemon_threads = True
+
+    def __init__(self, path, size=64):
+        self.path, self.parsers = path, _LRUCache(size)
+        if os.path.lexists(path):
+            check_socket(path)
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except socket.error:  # left by a daemon that didn't shut down
+                os.remove(path)
+            else:
+                raise socket.error('daemon already listens on %s' % path)
+            finally:
+                probe.close()
+        socketserver.UnixStreamServer.__init__(self, path, Handler)
+        os.chmod(path, stat.S_IRUSR | stat.S_IWUSR)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def respond(self, request):
+        parser = self.parsers.get(request.get('hash'))
+        if parser is None:
+            if 'doc' not in request:
+                return {'unknown': True}
+            try:
+                parser = compile(request['doc'])
+            except DocoptLanguageError:
+                return {'error': str(sys.exc_info()[1])}
+            self.parsers[digest(request['doc'])] = parser
+        argv, version = request.get('argv', []), request.get('version')
+        try:
+            # like `extras`, without printing or exiting
+            tokens = parse_args(argv, parser.options)
+            if request.get('help', True) and [o for o in tokens if o.name in
+                                              ('-h', '--help') and o.value]:
+                return {'output': parser.doc.strip(), 'status': 0}
+            if version is not None and [o for o in tokens if
+                                        o.name == '--version' and o.value]:
+                return {'output': str(version), 'status': 0}
+            return {'result': parser.parse(argv, False, None)}
+        except DocoptExit:  # DocoptExit.usage is shared by threads, not used
+            return {'reason': sys.exc_info()[1].reason,
+                    'usage': parser.usage, 'status': 1}
+
+
+def serve(path=None, size=64):
+    server = Server(path or default_socket(), size)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit())
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+class Client(object):
+
+    """Connection to daemon at socket `path`, which must be a socket owned
+    by the user, or `socket.error` is raised."""
+
+    def __init__(self, path=None):
+        path = path or default_socket()
+        check_socket(path)  # else anybody could answer in place of daemon
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(path)
+        self.responses = self.socket.makefile('rb')
+
+    def close(self):
+        self.responses.close()
+        self.socket.close()
+
+    def send(self, request):
+        self.socket.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        return json.loads(self.responses.readline().decode('utf-8'))
+
+    def request(self, doc, argv, help=True, version=None):
+        """Return response of daemon to parse request."""
+        request = {'hash': digest(doc), 'argv': argv, 'help': help,
+                   'version': version}
+        response = self.send(request)
+        if response.get('unknown'):
+            request['doc'] = doc
+            response = self.send(request)
+        if 'error' in response:
+            raise DocoptLanguageError(response['error'])
+        return response
+
+    def docopt(self, doc, argv=None, help=True, version=None):
+        """Parse argv like `docopt.docopt`, printing and exiting alike."""
+        response = self.request(doc, sys.argv[1:] if argv is None else argv,
+                                help, version)
+        if 'result' in response:
+            return Dict(response['result'])
+        if response['status']:
+            raise DocoptExit(response['reason'], response['usage'])
+        print(response['output'])
+        sys.exit()
+
+
+def docopt(doc, argv=None, help=True, version=None, path=None):
+    """Parse argv like `docopt.docopt`, by daemon if one is running."""
+    try:
+        client = Client(path)
+    except socket.error:
+        return _docopt(doc, sys.argv[1:] if argv is None else argv, help,
+                       version)
+    try:
+        return client.docopt(doc, argv, help, version)
+    finally:
+        client.close()
+
+
+def main():
+    arguments = _docopt(__doc__)
+    if arguments['serve']:
+        try:
+            serve(arguments['--socket'])
+        except socket.error:
+            sys.exit(str(sys.exc_info()[1]))
+        return
+    with open(arguments['<usage-file>']) as f:
+        doc = f.read()
+    print(json.dumps(docopt(doc, arguments['<argv>'],
+                            path=arguments['--socket'])))
+
+
+if __name__ == '__main__':
+    main()
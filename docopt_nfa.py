@@ -0,0 +1,377 @@
+"""Thompson-style matching engine for docopt usage patterns.
+
+Usage pattern is compiled into the program of a non-deterministic automaton,
+with instructions that consume a positional argument, consume a kind of
+option or split the thread of execution in two.  The automaton is simulated
+one positional argument at a time, keeping every live thread at once, the
+way Pike's regular expression VM does, so nothing is ever backtracked over:
+time is linear in the number of positional arguments times the size of the
+program.  Options are consumed by kind at any point of the pattern, so they
+are a bit mask of `docopt.Argv`, carried by every thread.
+
+Threads are kept in order of priority: optional elements and repetitions
+prefer to match, and alternatives prefer to match earlier branches.  Of all
+ways to match argv the most preferred one is reported.
+
+That is not how backtracking engines of `docopt` choose: their `Either`
+takes the branch that leaves the fewest tokens, and they never give back
+what an optional element matched.  So this engine accepts all that they
+accept, and more, with the same result if argv matches in one way only;
+where it matches in several, results may differ.  For usage
+"prog (<a> | go <b>) [<c>]" and argv "go x", backtracking matches
+`go <b>`, and this engine `<a> [<c>]`.
+
+`DFA` builds deterministic states of the same automaton lazily, as argv
+needs them, and caches them, so that programs that see the same shapes of
+commands over and over match each positional argument with a dictionary
+lookup.
+
+`Completer` runs the automaton over a prefix of argv, to tell which tokens
+may come next.
+
+"""
+from docopt import (Argv, Argument, Command, Option, AnyOptions,
+                    Required, Optional, OneOrMore, Either)
+
+
+MATCH, ARGUMENT, COMMAND, OPTION, ANY_OPTIONS, SPLIT = range(6)
+
+
+class NFA(object):
+
+    """Usage pattern compiled to be matched by simulating an automaton.
+
+    Program is a list of instructions, tuples of an opcode and operands:
+
+        (MATCH,)                 argv is matched if no options are left
+        (ARGUMENT, leaf, next)   consume any positional argument
+        (COMMAND, leaf, next)    consume positional argument `leaf.name`
+        (OPTION, leaf, next)     consume options of the kind of `leaf`
+        (ANY_OPTIONS, None, next)  consume options of all kinds
+        (SPLIT, next, other)     continue at both, preferring `next`
+
+    """
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.program = [(MATCH,)]
+        self.start = self.emit(pattern, 0)
+
+    def emit(self, pattern, next):
+        """Add instructions matching `pattern`, then going to `next`.
+
+        Return address of the first of them.
+
+        """
+        program = self.program
+        t = type(pattern)
+        if t is Required:
+            for c in reversed(pattern.children):
+                next = self.emit(c, next)
+            return next
+        elif t is Optional:
+            for c in reversed(pattern.children):
+                program.append((SPLIT, self.emit(c, next), next))
+                next = len(program) - 1
+            return next
+        elif t is Either:
+            branches = [self.emit(c, next) for c in pattern.children]
+            next = branches.pop()
+            for branch in reversed(branches):
+                program.append((SPLIT, branch, next))
+                next = len(program) - 1
+            return next
+        elif t is OneOrMore:
+            loop = len(program)
+            program.append(None)
+            body = self.emit(pattern.children[0], loop)
+            program[loop] = (SPLIT, body, next)
+            return body
+        elif t is AnyOptions:
+            program.append((ANY_OPTIONS, None, next))
+        else:
+            program.append(({Argument: ARGUMENT, Command: COMMAND,
+                              Option: OPTION}[t], pattern, next))
+        return len(program) - 1
+
+    def closure(self, threads, argv):
+        """Follow threads through instructions that consume no positional
+        arguments.  Return threads waiting to consume one, or to match.
+
+        Thread is a tuple (pc, m, entries), with `m` the mask of options
+        left and `entries` what it matched so far, as nested tuples
+        (entries, leaf, value).
+
+        """
+        program, seen, waiting = self.program, set(), []
+        stack = threads[::-1]
+        while stack:
+            pc, m, entries = thread = stack.pop()
+            if (pc, m) in seen:
+                continue
+            seen.add((pc, m))
+            op = program[pc]
+            if op[0] == SPLIT:
+                stack += [(op[2], m, entries), (op[1], m, entries)]
+            elif op[0] == OPTION:
+                bit = argv.bit(op[1])
+                if m & bit:
+                    stack.append((op[2], m ^ bit, entries))
+            elif op[0] == ANY_OPTIONS:
+                if m:
+                    stack.append((op[2], 0, entries))
+            else:
+                waiting.append(thread)
+        return waiting
+
+    def step(self, threads, value, argv):
+        """Consume positional argument `value` by each of `threads`."""
+        program, next = self.program, []
+        for pc, m, entries in threads:
+            op = program[pc]
+            if op[0] == ARGUMENT:
+                next.append((op[2], m, (entries, op[1], value)))
+            elif op[0] == COMMAND and op[1].name == value:
+                next.append((op[2], m, (entries, op[1], True)))
+        return self.closure(next, argv)
+
+    def match(self, left, collected=None):
+        collected = [] if collected is None else collected
+        argv = Argv(left)
+        threads = self.closure([(self.start, argv.mask, None)], argv)
+        for value in argv.args:
+            threads = self.step(threads, value, argv)
+        for pc, m, entries in threads:
+            if self.program[pc][0] == MATCH and not m:
+                flat = []
+                while entries is not None:
+                    entries, leaf, value = entries
+                    flat.append((leaf, value))
+                return True, [], argv.collect(flat[::-1], collected)
+        return False, left, collected
+
+
+class State(object):
+
+    """State of `DFA`: threads of `NFA`, without what they matched."""
+
+    __slots__ = ('threads', 'accept', 'next')
+
+    def __init__(self, threads, accept):
+        self.threads = threads  # tuple of (pc, m), by priority
+        self.accept = accept  # index of first matching thread, or None
+        self.next = {}  # class of argument: (state, origins)
+
+
+class DFA(NFA):
+
+    """Deterministic automaton, built lazily over states of `NFA`.
+
+    Positional arguments are told apart only by whether they name one of
+    the commands of the pattern, so each state has a transition for every
+    command, and one, keyed by `None`, for all other arguments.  Along
+    with the next state every transition records origins of its threads:
+    index of thread in the previous state and leaf it matched, so that
+    after argv is consumed, entries of the matching thread are traced back.
+
+    At most `max_states` states are cached; argv that needs more is matched
+    by simulating the `NFA`.
+
+    """
+
+    def __init__(self, pattern, max_states=10000):
+        NFA.__init__(self, pattern)
+        self.max_states = max_states
+        self.bits, self.commands = {}, set()
+        for op in self.program:
+            if op[0] == OPTION:
+                self.bits.setdefault((op[1].short, op[1].long),
+                                     len(self.bits))
+            elif op[0] == COMMAND:
+                self.commands.add(op[1].name)
+        self.states, self.starts = {}, {}
+
+    def bit(self, option):
+        return 1 << self.bits[option.short, option.long]
+
+    def state(self, waiting):
+        """Return cached state of `waiting` threads, None if cache is full."""
+        threads = tuple((pc, m) for pc, m, _ in waiting)
+        if threads not in self.states:
+            if len(self.states) >= self.max_states:
+                return None
+            accept = [i for i, (pc, m) in enumerate(threads)
+                      if self.program[pc][0] == MATCH and not m]
+            self.states[threads] = State(threads, accept[0] if accept
+                                                  else None)
+        return self.states[threads]
+
+    def transition(self, state, cls):
+        seeds = []
+        for i, (pc, m) in enumerate(state.threads):
+            op = self.program[pc]
+            if op[0] == ARGUMENT or (op[0] == COMMAND and op[1].name == cls):
+                seeds.append((op[2], m, (i, op[1])))
+        waiting = self.closure(seeds, self)
+        next = self.state(waiting)
+        if next is None:
+            return None
+        state.next[cls] = next, tuple(origin for _, _, origin in waiting)
+        return state.next[cls]
+
+    def match(self, left, collected=None):
+        collected = [] if collected is None else collected
+        argv = Argv(left, self.bits)
+        state = self.starts.get(argv.mask)
+        if state is None:
+            state = self.state(self.closure([(self.start, argv.mask, None)],
+                                            self))
+            if state is None:
+                return NFA.match(self, left, collected)
+            self.starts[argv.mask] = state
+        commands, trail = self.commands, []
+        for value in argv.args:
+            cls = value if value in commands else None
+            next = state.next.get(cls) or self.transition(state, cls)
+            if next is None:
+                return NFA.match(self, left, collected)
+            state, origins = next
+            if not state.threads:
+                return False, left, collected
+            trail.append(origins)
+        if state.accept is None:
+            return False, left, collected
+        entries, i = [], state.accept
+        for k in range(len(trail) - 1, -1, -1):
+            i, leaf = trail[k][i]
+            entries.append((leaf, True if type(leaf) is Command
+                                  else argv.args[k]))
+        return True, [], argv.collect(entries[::-1], collected)
+
+
+class Completer(NFA):
+
+    """Automaton that tells which tokens may follow a prefix of argv.
+
+    Unlike matching, where argv is known in full, options of a prefix may be
+    consumed by instructions already passed, and options not typed yet may
+    still be.  So every thread (pc, m, s) carries the mask `m` of kinds of
+    options typed but not consumed yet, which it must meet ahead, and the
+    mask `s` of kinds it passed without consuming, which may be typed
+    later.  Kinds are numbered by their order in `options`.
+
+    Options that may be consumed ahead of a thread are over-approximated
+    by the kinds reachable from its instruction, until positional arguments
+    decide the branch it takes.
+
+    States after each prefix of argv are cached, so that completing a
+    prefix one token longer than the last one steps a single token.
+
+    """
+
+    def __init__(self, pattern, options, size=1024):
+        from docopt import _LRUCache
+        NFA.__init__(self, pattern)
+        self.bits, self.options = {}, []
+        for o in options:
+            if (o.short, o.long) not in self.bits:
+                self.bits[o.short, o.long] = len(self.options)
+                self.options.append(o)
+        for op in self.program:
+            if op[0] == OPTION and (op[1].short, op[1].long) not in self.bits:
+                self.bits[op[1].short, op[1].long] = len(self.options)
+                self.options.append(op[1])
+        self.all = (1 << len(self.options)) - 1
+        self.reach = self.reachable()
+        self.states = _LRUCache(size)
+
+    def bit(self, option):
+        return 1 << self.bits[option.short, option.long]
+
+    def reachable(self):
+        """Return, for each instruction, mask of kinds of options that may
+        be consumed from there on."""
+        program = self.program
+        own = [self.bit(op[1]) if op[0] == OPTION else
+               self.all if op[0] == ANY_OPTIONS else 0 for op in program]
+        reach, changed = own[:], True
+        while changed:  # loops of OneOrMore need more than one pass
+            changed = False
+            for pc, op in enumerate(program):
+                mask = own[pc]
+                for next in (op[1:] if op[0] == SPLIT else op[2:]):
+                    mask |= reach[next]
+                if mask != reach[pc]:
+                    reach[pc], changed = mask, True
+        return reach
+
+    def closure(self, threads):
+        """Follow threads (pc, m, s) to instructions that consume positional
+        arguments, or to MATCH."""
+        program, reach, seen, waiting = self.program, self.reach, set(), []
+        stack = threads[::-1]
+        while stack:
+            pc, m, s = thread = stack.pop()
+            if thread in seen:
+                continue
+            seen.add(thread)
+            op = program[pc]
+            if op[0] == SPLIT:
+                stack += [(op[2], m, s), (op[1], m, s)]
+            elif op[0] == OPTION:
+                bit = self.bit(op[1])
+                stack.append((op[2], m ^ bit, s) if m & bit
+                             else (op[2], m, s | bit))
+            elif op[0] == ANY_OPTIONS:
+                stack.append((op[2], 0, s | self.all & ~m))
+            elif not m & ~reach[pc]:  # typed options can still be consumed
+                waiting.append(thread)
+        return waiting
+
+    def step(self, state, token):
+        """Return state (threads, typed) after `state` and argv token."""
+        threads, typed = state
+        if type(token) is Option:
+            bit = self.bit(token)
+            if typed & bit:  # kind is consumed at once, greedily
+                return state
+            return tuple((pc, m, s ^ bit) if s & bit else (pc, m | bit, s)
+                         for pc, m, s in threads
+                         if (s | self.reach[pc]) & bit), typed | bit
+        program, next = self.program, []
+        for pc, m, s in threads:
+            op = program[pc]
+            if op[0] == ARGUMENT or (op[0] == COMMAND and
+                                     op[1].name == token.value):
+                next.append((op[2], m, s))
+        return tuple(self.closure(next)), typed
+
+    def state(self, tokens):
+        """Return state after argv `tokens`, stepping from cached states."""
+        keys = tuple((t.short, t.long) if type(t) is Option else t.value
+                     for t in tokens)
+        n = len(keys)
+        while n and keys[:n] not in self.states:
+            n -= 1
+        if n:
+            state = self.states.get(keys[:n])
+        else:
+            state = tuple(self.closure([(self.start, 0, 0)])), 0
+        for i in range(n, len(keys)):
+            state = self.step(state, tokens[i])
+            self.states[keys[:i + 1]] = state
+        return state
+
+    def complete(self, tokens):
+        """Return commands, arguments and options that may follow argv
+        `tokens`, in order of priority of threads, options last."""
+        threads, typed = self.state(tokens)
+        program, leaves, names, options = self.program, [], set(), 0
+        for pc, m, s in threads:
+            op = program[pc]
+            if op[0] in (ARGUMENT, COMMAND) and op[1].name not in names:
+                names.add(op[1].name)
+                leaves.append(op[1])
+            options |= (s | self.reach[pc]) & ~typed
+        return leaves + [o for i, o in enumerate(self.options)
+                         if options & 1 << i]
@@ -592,42 +592,51 @@ import sys, json
 from subprocess import Popen, PIPE, STDOUT
 
 
-testee = (sys.argv[1] if len(sys.argv) >= 2 else
-        exit('Usage: language_agnostic_tester.py ./path/to/executable/testee [ID ...]'))
-ids = [int(x) for x in sys.argv[2:]] if len(sys.argv) > 2 else None
-summary = ''
-
-index = 0
-for fixture in __doc__.split('r"""'):
-    doc, _, body = fixture.partition('"""')
-    for case in body.split('$')[1:]:
-        index += 1
+def fixtures():
+    """Yield (index, doc, argv, expect) for each test case in the corpus."""
+    index = 0
+    for fixture in __doc__.split('r"""'):
+        doc, _, body = fixture.partition('"""')
+        for case in body.split('$')[1:]:
+            index += 1
+            argv, _, expect = case.strip().partition('\n')
+            prog, _, argv = argv.strip().partition(' ')
+            assert prog == 'prog', repr(prog)
+            yield index, doc, argv, expect
+
+
+def main(testee, ids=None):
+    summary = ''
+    for index, doc, argv, expect in fixtures():
         if ids is not None and index not in ids:
             continue
-        argv, _, expect = case.strip().partition('\n')
-        prog, _, argv = argv.strip().partition(' ')
-        assert prog == 'prog', repr(prog)
         p = Popen(testee + ' ' + argv,
                   stdout=PIPE, stdin=PIPE, stderr=STDOUT, shell=True)
-        result = p.communicate(input=doc)[0]
+        result = p.communicate(input=doc.encode('utf-8'))[0].decode('utf-8')
         try:
             py_result = json.loads(result)
             py_expect = json.loads(expect)
         except:
             summary += 'J'
-            print (' %d: BAD JSON ' % index).center(79, '=')
-            print 'result>', result
-            print 'expect>', expect
+            print((' %d: BAD JSON ' % index).center(79, '='))
+            print('result> ' + result)
+            print('expect> ' + expect)
             continue
         if py_result == py_expect:
             summary += '.'
         else:
-            print (' %d: FAILED ' % index).center(79, '=')
-            print 'r"""%s"""' % doc
-            print '$ prog %s\n' % argv
-            print 'result>', result
-            print 'expect>', expect
+            print((' %d: FAILED ' % index).center(79, '='))
+            print('r"""%s"""' % doc)
+            print('$ prog %s\n' % argv)
+            print('result> ' + result)
+            print('expect> ' + expect)
             summary += 'F'
 
-print (' %d / %d ' % (summary.count('.'), len(summary))).center(79, '=')
-print summary
+    print((' %d / %d ' % (summary.count('.'), len(summary))).center(79, '='))
+    print(summary)
+
+
+if __name__ == '__main__':
+    testee = (sys.argv[1] if len(sys.argv) >= 2 else
+            exit('Usage: language_agnostic_tester.py ./path/to/executable/testee [ID ...]'))
+    main(testee, [int(x) for x in sys.argv[2:]] if len(sys.argv) > 2 else None)
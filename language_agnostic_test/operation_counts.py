@@ -0,0 +1,81 @@
+"""Check counts of work of parsing each test case of the language-agnostic
+test suite against those recorded in operation_counts.json.
+
+Usage: operation_counts.py [--update]
+
+Options:
+  --update  Record current counts instead.
+
+Counts (see `docopt.Counters`) are of `Parser.parse(argv)` with the
+default engine, so they are the same on every run and machine.  Exits with
+status 1 if any count grew, as when a change makes matching do more work
+on a known usage; counts that shrank are only reported, so that they can
+be recorded.
+
+"""
+from __future__ import with_statement
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+from docopt import docopt, compile, count, DocoptExit, Counters
+from language_agnostic_tester import fixtures
+
+golden = os.path.join(os.path.dirname(__file__), 'operation_counts.json')
+
+
+def counts():
+    """Return {index of test case: {name: count}}."""
+    results, parsers = {}, {}
+    for index, doc, argv, expect in fixtures():
+        if doc not in parsers:
+            parsers[doc] = compile(doc)
+        with count() as c:
+            try:
+                parsers[doc].parse(argv, help=False)
+            except DocoptExit:
+                pass
+        results[str(index)] = c.counts
+    return results
+
+
+def compare(results, recorded):
+    """Return changes (index, name, recorded, result) that grew and shrank."""
+    grown, shrunk = [], []
+    for index in sorted(results, key=int):
+        for name in Counters.names:
+            before = recorded.get(index, {}).get(name)
+            after = results[index][name]
+            if before is None or after > before:
+                grown.append((index, name, before, after))
+            elif after < before:
+                shrunk.append((index, name, before, after))
+    return grown, shrunk
+
+
+def main():
+    arguments = docopt(__doc__)
+    results = counts()
+    if arguments['--update']:
+        with open(golden, 'w') as f:  # a line per case, for readable diffs
+            f.write('{\n%s\n}\n' % ',\n'.join(
+                    '%s: %s' % (json.dumps(index),
+                                json.dumps(results[index], sort_keys=True))
+                    for index in sorted(results, key=int)))
+        return
+    with open(golden) as f:
+        recorded = json.load(f)
+    grown, shrunk = compare(results, recorded)
+    for label, changes in (('GREW', grown), ('shrank', shrunk)):
+        for index, name, before, after in changes:
+            print('%s case %s %s: %s -> %d' % (label, index, name, before,
+                                               after))
+    if shrunk and not grown:
+        print('Record improvements with --update.')
+    if grown:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+#! /usr/bin/env python
+from docopt import DocoptExit
+from docopt_daemon import docopt
+import sys, json
+
+doc = sys.stdin.read()
+
+try:
+    print(json.dumps(docopt(doc)))
+except DocoptExit:
+    print('"user-error"')
@@ -11,7 +11,7 @@ setup(
     license = "MIT",
     keywords = "option arguments parsing optparse argparse getopt",
     url = "http://docopt.org",
-    py_modules=['docopt'],
+    py_modules=['docopt', 'docopt_codegen', 'docopt_daemon', 'docopt_nfa'],
     long_description=__doc__,
     classifiers=[
         "Development Status :: 3 - Alpha",
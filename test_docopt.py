@@ -1,11 +1,28 @@
 from __future__ import with_statement
+import os
+import sys
+import json
+import copy
+import pickle
 from docopt import (docopt, DocoptExit, DocoptLanguageError,
                     Option, Argument, Command,
                     Required, Optional, Either, OneOrMore, AnyOptions,
-                    parse_args, parse_pattern,
-                    parse_doc_options, printable_usage, formal_usage
+                    parse_args, parse_pattern, TokenStream,
+                    parse_doc_options, printable_usage, formal_usage,
+                    compile, Parser, _LRUCache, Packrat, engines, OptionTable,
+                    docopt_many, ParseFailure, stream, Columns, profile,
+                    count
                    )
-from pytest import raises
+from pytest import raises, importorskip, skip
+
+
+def _import_from(directory, name):
+    """Import module `name` from `directory` next to this file."""
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), directory))
+    try:
+        return __import__(name)
+    finally:
+        sys.path.pop(0)
 
 
 def test_pattern_flat():
@@ -80,6 +97,29 @@ def test_parse_doc_options():
                                       Option(None, '--verbose')]
 
 
+def test_option_table():
+    o = OptionTable(parse_doc_options('-h --help\n--verbose\n--version\n-v'))
+    assert o == [Option('-h', '--help'), Option(None, '--verbose'),
+                 Option(None, '--version'), Option('-v')]
+    assert o.long('--ver') == [Option(None, '--verbose'),
+                               Option(None, '--version')]
+    assert o.long('--verb') == [Option(None, '--verbose')]
+    assert o.long('--x') == []
+    assert o.short('h') == [Option('-h', '--help')]
+    assert parse_args('--he -hv', o) == parse_args('--he -hv', list(o))
+    o.append(Option('-x', '--xray'))
+    assert parse_args('--x -x', o) == [Option('-x', '--xray', 0, True)] * 2
+    with raises(DocoptExit):
+        parse_args('--ver', o)
+    o = parse_doc_options('--verbose\n--version')
+    for c in copy.copy(o), copy.deepcopy(o), pickle.loads(pickle.dumps(o)):
+        assert type(c) is OptionTable and c == o
+        assert c.long('--verb') == [Option(None, '--verbose')]
+        assert parse_args('--verb', c) == [Option(None, '--verbose', 0, True)]
+        c.append(Option(None, '--verbatim'))
+        assert len(o.long('--verb')) == 1
+
+
 def test_printable_and_formal_usage():
     doc = """
     Usage: prog [-hv] ARG
@@ -115,6 +155,21 @@ def test_parse_args():
              Argument(None, '-v')]
 
 
+def test_token_stream():
+    tokens = TokenStream('a b c', DocoptExit)
+    assert tokens.current() == 'a'
+    assert tokens.move() == 'a'
+    assert list(tokens) == ['b', 'c']
+    assert tokens.current() is None and tokens.move() is None
+    consumed = []
+    source = (consumed.append(t) or t for t in ['-a', 'b', 'c'])
+    tokens = TokenStream(source, DocoptExit)
+    assert tokens.move() == '-a' and consumed == ['-a', 'b']
+    assert parse_args((a for a in ['-a', '--', '-b']), [Option('-a')]) == \
+            [Option('-a', None, 0, True), Argument(None, '--'),
+             Argument(None, '-b')]
+
+
 def test_parse_pattern():
     o = [Option('-h'), Option('-v', '--verbose'), Option('-f', '--file', 1)]
     assert parse_pattern('[ -h ]', options=o) == \
@@ -272,6 +327,26 @@ def test_list_argument_match():
                     (True, [], [Argument('N', [1, 2])])
 
 
+def test_match_does_not_leak_state():
+    pattern = Required(Argument('N'), Either(Required(Argument('N'),
+                                                      Command('x')),
+                                             Argument('N'))).fix()
+    assert pattern.match([Argument(None, 1), Argument(None, 2)]) == \
+            (True, [], [Argument('N', [1, 2])])
+    collected = [Argument('N', [0])]
+    assert OneOrMore(Argument('N', [])).match([Argument(None, 1)],
+                                              collected) == \
+            (True, [], [Argument('N', [0, 1])])
+    assert collected == [Argument('N', [0])]
+
+
+def test_match_long_argv():
+    argv = [Argument(None, i) for i in range(100000)] + [Option('-v')]
+    pattern = Required(Optional(Option('-v')), OneOrMore(Argument('N'))).fix()
+    matched, left, collected = pattern.match(argv)
+    assert matched and left == [] and collected[0].value == list(range(100000))
+
+
 def test_basic_pattern_matching():
     # ( -a N [ -x Z ] )
     pattern = Required(Option('-a'), Argument('N'),
@@ -331,11 +406,41 @@ def test_pattern_fix_list_arguments():
                         OneOrMore(Argument('N', [])))
 
 
+def test_pattern_counts():
+    n, m, k = Argument('N'), Argument('M'), Argument('K')
+    assert Required(n, Either(m, Required(m, n)), OneOrMore(k)).counts() == \
+            {n: 2, m: 1, k: 2}
+    assert Either(n, Optional(m, Command('c'), Option('-o'))).counts() == \
+            {n: 1, m: 1}
+
+
+def test_fix_many_optional_alternatives():
+    pattern = parse_pattern(' '.join('[(a%d | <x>)]' % i for i in range(300)),
+                            options=[]).fix()
+    assert Argument('<x>', []) in pattern.flat
+
+
 def test_set():
     assert Argument('N') == Argument('N')
     assert set([Argument('N'), Argument('N')]) == set([Argument('N')])
 
 
+def test_structural_equality():
+    assert Argument('N') != Argument('N', [])
+    assert Argument('N') != Command('N')
+    assert Option('-a', '--all') != Option('-a', '--all', 1)
+    assert Option('-a', None, 1, 'x') == Option('-a', None, 1, 'x')
+    assert hash(Option('-a', '--all')) == hash(Option('-a', '--all', 0, True))
+    a = Argument('N')
+    h = hash(a)
+    a.value = []
+    assert hash(a) == h and a == Argument('N', [])
+    assert Required(a, Option('-a')) == Required(Argument('N', []),
+                                                 Option('-a'))
+    assert Required(a) != Optional(a)
+    assert hash(Required(a, Option('-a'))) == hash(Required(a, Option('-a')))
+
+
 def test_pattern_fix_identities_1():
     pattern = Required(Argument('N'), Argument('N'))
     assert pattern.children[0] == pattern.children[1]
@@ -500,3 +605,560 @@ def test_bug():
                   '') == {'<a>': None, '<b>': None}
     assert docopt('usage: prog <a> <b> \n prog',
                   '') == {'<a>': None, '<b>': None}
+
+
+def test_compile():
+    parser = compile('usage: prog [-v] <name>...\n\n-v  Verbose.')
+    assert type(parser) is Parser
+    assert parser.usage == 'usage: prog [-v] <name>...'
+    assert parser.parse('a b') == {'-v': False, '<name>': ['a', 'b']}
+    assert parser.parse(['-v', 'c']) == {'-v': True, '<name>': ['c']}
+    with raises(DocoptExit):
+        parser.parse('')
+    with raises(AttributeError):
+        parser.pattern = None
+
+
+def test_compiled_parser_is_not_altered_by_results():
+    parser = compile('usage: prog [<name>...]')
+    parser.parse('').get('<name>').append('x')
+    assert parser.parse('') == {'<name>': []}
+    doc = 'usage: prog [<name>...]'
+    docopt(doc, '').get('<name>').append('x')
+    assert docopt(doc, '') == {'<name>': []}
+
+
+def test_lru_cache():
+    cache = _LRUCache(2)
+    cache['a'], cache['b'] = 1, 2
+    assert cache.get('a') == 1
+    cache['c'] = 3
+    assert 'a' in cache and 'c' in cache and 'b' not in cache
+    assert cache.get('b') is None and len(cache) == 2
+    empty = _LRUCache(0)
+    empty['a'] = 1
+    assert empty.get('a') is None and len(empty) == 0
+
+
+def test_lru_cache_threads():
+    import threading
+    from docopt import _parsers
+    docs = ['usage: prog%d <a>' % i for i in range(100)]
+    errors = []
+
+    def parse():
+        try:
+            for _ in range(5):
+                for doc in docs:
+                    assert docopt(doc, 'x') == {'<a>': 'x'}
+        except Exception:
+            errors.append(sys.exc_info()[1])
+
+    interval = getattr(sys, 'getswitchinterval', lambda: None)()
+    if interval is not None:
+        sys.setswitchinterval(1e-6)  # switch threads as often as possible
+    try:
+        threads = [threading.Thread(target=parse) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        if interval is not None:
+            sys.setswitchinterval(interval)
+    assert errors == []
+    link, links = _parsers.root[1], 0
+    while link is not _parsers.root:
+        link, links = link[1], links + 1
+    assert links == len(_parsers) == 64
+
+
+def test_parse_usage_threads():
+    import threading
+    parsers = [compile('usage: prog%d <a>' % i) for i in range(2)]
+    errors = []
+
+    def parse(parser):
+        for argv in ['', '--x'] * 500:
+            try:
+                parser.parse(argv)
+            except DocoptExit:
+                e = sys.exc_info()[1]
+                if e.usage != parser.usage or parser.usage not in str(e):
+                    errors.append(e)
+
+    interval = getattr(sys, 'getswitchinterval', lambda: None)()
+    if interval is not None:
+        sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=parse, args=(p,))
+                   for p in parsers * 2]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        if interval is not None:
+            sys.setswitchinterval(interval)
+    assert errors == []
+    assert str(DocoptExit('bad', 'usage: x')) == 'bad\nusage: x'
+
+
+def test_compile_with_cache(tmpdir):
+    doc = """Usage: prog [-v] [--speed=<kn>] <name> <name> [(add|rm) <x>...]
+
+    -v            Verbose.
+    --speed=<kn>  Speed [default: 10]."""
+    cache = str(tmpdir)
+    compiled = compile(doc, cache=cache)
+    [name] = os.listdir(cache)
+    loaded = compile(doc, cache=cache)
+    assert loaded.pattern == compiled.pattern == Parser(doc).pattern
+    assert loaded.options == compiled.options
+    assert loaded.usage == compiled.usage
+    assert loaded.parse('a b rm 1 2') == compiled.parse('a b rm 1 2') == {
+            '-v': False, '--speed': '10', '<name>': ['a', 'b'],
+            'add': False, 'rm': True, '<x>': ['1', '2']}
+    assert os.listdir(cache) == [name]
+
+
+def test_response_files(tmpdir):
+    doc = 'Usage: prog [-v] [-o FILE] <file>...\n\n-v\n-o FILE'
+    files = tmpdir.join('files')
+    files.write('a\n-v\n\nb\r\n-oout\n')
+    assert docopt(doc, ['@' + str(files), 'c'], response_files=True) == {
+            '-v': True, '-o': 'out', '<file>': ['a', 'b', 'c']}
+    assert docopt(doc, ['--', '@x'], response_files=True) == {
+            '-v': False, '-o': None, '<file>': ['--', '@x']}
+    assert docopt(doc, ['@x']) == {'-v': False, '-o': None, '<file>': ['@x']}
+    assert docopt(doc, '@%s z' % files, response_files=True) == {
+            '-v': True, '-o': 'out', '<file>': ['a', 'b', 'z']}
+    missing = str(tmpdir.join('missing'))
+    with raises(DocoptExit) as exit:
+        docopt(doc, ['@' + missing], response_files=True)
+    assert exit.value.reason.startswith('cannot read %s: ' % missing)
+
+
+def test_stdin_list(monkeypatch):
+    from io import StringIO
+    doc = 'Usage: prog <x> <file>...'
+    monkeypatch.setattr(sys, 'stdin', StringIO(u'b\nc\n'))
+    assert docopt(doc, '- a - d', stdin='<file>') == {
+            '<x>': '-', '<file>': ['a', 'b', 'c', 'd']}
+    with raises(DocoptLanguageError):
+        docopt(doc, 'x a', stdin='<x>')
+
+
+def test_compile_with_corrupt_cache(tmpdir):
+    doc = 'usage: prog <a>'
+    compile(doc, cache=str(tmpdir))
+    [path] = tmpdir.listdir()
+    path.write('garbage')
+    assert compile(doc, cache=str(tmpdir)).parse('1') == {'<a>': '1'}
+    assert compile(doc, cache=str(tmpdir)).parse('2') == {'<a>': '2'}
+
+
+def test_codegen():
+    import docopt_codegen
+    doc = """Usage: prog ship new <name>...
+              prog ship <name> move <x> <y> [--speed=<kn>]
+              prog mine (set|remove) <x> <y> [--moored|--drifting]
+              prog [options] [-]
+
+    --speed=<kn>  Speed in knots [default: 10].
+    --moored      Moored (anchored) mine.
+    --drifting    Drifting mine.
+    -v            Verbose."""
+    generated = docopt_codegen.load(doc)['docopt']
+    for argv in ['ship new a b', 'ship a move 1 2 --speed=3', '-v', '-v -',
+                 'mine set 1 2 --moored', '']:
+        assert generated(argv) == docopt(doc, argv)
+    for argv in ['ship a move 1', 'mine set 1 2 --moored --drifting', 'x']:
+        with raises(DocoptExit):
+            generated(argv)
+
+
+def test_codegen_on_language_agnostic_tests():
+    import docopt_codegen
+    tester = os.path.join(os.path.dirname(__file__), 'language_agnostic_test',
+                          'language_agnostic_tester.py')
+    assert docopt_codegen.check(tester) == []
+
+
+def test_codegen_completion(tmpdir):
+    import subprocess
+    import docopt_codegen
+    doc = """Usage: prog ship new <name>...
+              prog ship <name> move <x> <y> [--speed=<kn>]
+              prog mine (set|remove) [--moored|--drifting]
+
+    --speed=<kn>  Speed in knots [default: 10].
+    --moored      Moored (anchored) mine.
+    --drifting    Drifting mine."""
+    for shell in ('zsh', 'fish'):
+        assert '_prog_docopt' in docopt_codegen.completion(doc, shell)
+    script = tmpdir.join('prog.bash')
+    script.write(docopt_codegen.completion(doc, 'bash'))
+    cases = {'': 'ship mine --speed --moored --drifting',
+             'ship': 'new --speed', 'ship a --speed 3': 'move --speed',
+             'mine set --moored': '--moored --drifting', 'mine set x': ''}
+    for line, words in sorted(cases.items()):
+        command = ('source %s; COMP_WORDS=(prog %s x); COMP_CWORD=%d; '
+                   'compgen() { [ $1 = -W ] && echo $2; }; _prog_docopt; '
+                   'echo ${COMPREPLY[*]}' %
+                   (script, line, len(line.split()) + 1))
+        try:
+            output = subprocess.check_output(['bash', '-c', command])
+        except OSError:  # no bash
+            return
+        assert output.decode().strip() == words
+
+
+def test_packrat_match():
+    pattern = Required(Either(Required(Argument('N'), Option('-a')),
+                              Required(Argument('N'), Argument('M'))),
+                       Optional(Command('c')))
+    assert Packrat(pattern).match([Argument(None, 1), Option('-a'),
+                                   Argument(None, 'c')]) == \
+            (True, [], [Argument('N', 1), Command('c', True)])
+    assert Packrat(pattern).match([Argument(None, 1), Argument(None, 2)]) == \
+            (True, [], [Argument('N', 1), Argument('M', 2)])
+    assert Packrat(pattern).match([Option('-a')]) == \
+            (False, [Option('-a')], [])
+    assert Packrat(OneOrMore(Argument('N')).fix()).match(
+            [Argument(None, 1), Option('-x'), Argument(None, 2)]) == \
+            (True, [Option('-x')], [Argument('N', [1, 2])])
+
+
+def test_engines_on_language_agnostic_tests():
+    fixtures = _import_from('language_agnostic_test',
+                            'language_agnostic_tester').fixtures
+    for engine in engines:
+        for index, doc, argv, expect in fixtures():
+            try:
+                result = docopt(doc, argv, engine=engine)
+            except DocoptExit:
+                result = 'user-error'
+            assert (engine, index, result) == (engine, index,
+                                               json.loads(expect))
+
+
+def test_nfa_engine():
+    from docopt_nfa import NFA
+    assert NFA(Required(Argument('N'), Option('-a'))).match(
+            [Option('-a'), Argument(None, 1)]) == \
+            (True, [], [Argument('N', 1)])
+    assert NFA(Either(Command('add'), Command('rm'))).match(
+            [Argument(None, 'mv')]) == (False, [Argument(None, 'mv')], [])
+    doc = 'usage: prog [<name>] move <x>'
+    assert docopt(doc, 'a move 1', engine='nfa') == \
+            {'<name>': 'a', 'move': True, '<x>': '1'}
+    # backtracking engine won't give up the greedy match of [<name>]
+    assert docopt(doc, 'move 1', engine='nfa') == \
+            {'<name>': None, 'move': True, '<x>': '1'}
+    with raises(DocoptExit):
+        docopt(doc, 'move 1')
+    # of alternatives, automata prefer earlier ones, not those leaving less
+    doc = 'usage: prog (<a> | go <b>) [<c>]'
+    for engine in ('backtrack', 'packrat'):
+        assert docopt(doc, 'go x', engine=engine) == \
+                {'<a>': None, 'go': True, '<b>': 'x', '<c>': None}
+    for engine in ('nfa', 'dfa'):
+        assert docopt(doc, 'go x', engine=engine) == \
+                {'<a>': 'go', 'go': False, '<b>': None, '<c>': 'x'}
+
+
+def test_dfa_engine():
+    from docopt_nfa import DFA
+    parser = compile('usage: prog ship <name> move <x> <y> [--speed=<kn>]\n'
+                     '       prog ship new <name>...')
+    dfa = parser.matcher('dfa')
+    assert parser.parse('ship a move 1 2', engine='dfa') == \
+            parser.parse('ship a move 1 2')
+    states = len(dfa.states)
+    assert parser.parse('ship b move 3 4', engine='dfa')['<name>'] == ['b']
+    assert len(dfa.states) == states
+    assert parser.parse('ship new a b c', engine='dfa')['<name>'] == \
+            ['a', 'b', 'c']
+    with raises(DocoptExit):
+        parser.parse('ship a move 1', engine='dfa')
+    small = DFA(parser.pattern, max_states=2)
+    argv = parse_args('ship new a b', parser.options)
+    assert small.match(argv) == parser.matcher('nfa').match(argv)
+    assert len(small.states) == 2
+
+
+def test_engines_on_synthetic_usages():
+    synthetic = _import_from('benchmarks', 'synthetic')
+    assert synthetic.argvs(synthetic.usage(), seed=1) == \
+            synthetic.argvs(synthetic.usage(), seed=1)
+    for seed in range(3):
+        for shape in [dict(commands=3, options=4, depth=2, width=3,
+                           repeat=True),
+                      dict(commands=3, options=30, collisions=True, depth=3,
+                           shared=True)]:
+            doc = synthetic.usage(seed, **shape)
+            parser = compile(doc)
+            for matching in (True, False):
+                for argv in synthetic.argvs(doc, seed, matching=matching,
+                                            abbreviate=True):
+                    expect = parser.parse(argv) if matching else None
+                    for engine in engines:
+                        try:
+                            result = parser.parse(argv, engine=engine)
+                        except DocoptExit:
+                            result = None
+                        if engine in ('backtrack', 'packrat'):
+                            assert (engine, argv, result) == \
+                                    (engine, argv, expect)
+                        elif matching:  # automata may match another way
+                            assert (engine, argv, result is None) == \
+                                    (engine, argv, False)
+
+
+def test_docopt_many():
+    doc = 'Usage: prog [-v] <x>\n\n-v'
+    batch = docopt_many(doc, ['a', '-v b', ['a'], 'a b', '--help', 'a b'])
+    assert batch == [{'-v': False, '<x>': 'a'}, {'-v': True, '<x>': 'b'},
+                     {'-v': False, '<x>': 'a'}, ParseFailure('a b'),
+                     ParseFailure('--help', '--help is not recognized'),
+                     ParseFailure('a b')]
+    assert batch.failures == batch[3:]
+    assert batch.hits == 2 and batch[3] is batch[5]
+    assert batch.elapsed >= 0 and batch.throughput > 0
+    batch = docopt_many(doc, ['a', 'a b', 'a', 'a b'], size=0)
+    assert batch == [{'-v': False, '<x>': 'a'}, ParseFailure('a b')] * 2
+    assert batch.hits == 0 and batch[0] is not batch[2]
+
+
+def test_pickle_parser():
+    import pickle
+    parser = compile('Usage: prog [-v] (a|b) <x>...\n\n-v')
+    loaded = pickle.loads(pickle.dumps(parser, 2))
+    assert loaded.pattern == parser.pattern
+    assert loaded.options == parser.options
+    assert loaded.parse('-v b 1 2') == parser.parse('-v b 1 2')
+
+
+def test_docopt_many_processes():
+    doc = 'Usage: prog <x> [<y>]'
+    argvs = ['%d' % i for i in range(20)] + ['1 2 3']
+    batch = docopt_many(doc, argvs, processes=2, chunksize=3)
+    assert batch == docopt_many(doc, argvs)
+    batch = docopt_many(doc, argvs, processes=2, ordered=False, chunksize=3)
+    assert sorted(batch.indexes) == list(range(21))
+    assert [r for i, r in sorted(zip(batch.indexes, batch))] == \
+            docopt_many(doc, argvs)
+
+
+def test_stream():
+    doc = 'Usage: prog [-h] [-m <msg>] <x>\n\n-h\n-m <msg>'
+    lines = iter(['a\n', '-m "hello world" b', "-h 'c d'", 'a b', 'a "b'])
+    results = stream(doc, lines)
+    assert next(results) == {'-h': False, '-m': None, '<x>': 'a'}
+    assert next(results) == {'-h': False, '-m': 'hello world', '<x>': 'b'}
+    assert next(results) == {'-h': True, '-m': None, '<x>': 'c d'}
+    assert next(results) == ParseFailure('a b')
+    assert next(results) == ParseFailure('a "b', 'No closing quotation')
+    assert list(results) == []
+
+
+def test_docopt_many_columns():
+    doc = 'Usage: prog [-v] [-o FILE] (add|rm) <x>...\n\n-v\n-o FILE'
+    argvs = ['add a b', '-v rm a', 'bad', '-o f add c', '-v rm a']
+    columns = docopt_many(doc, argvs, columns=True)
+    assert type(columns) is Columns and len(columns) == 5
+    assert columns.names() == ['-o', '-v', '<x>', 'add', 'rm']
+    batch = docopt_many(doc, argvs)
+    assert [columns.row(i) for i in range(5)] == \
+            batch[:2] + [ParseFailure(None, batch[2].reason)] + batch[3:]
+    assert list(columns['-v'].bits) == [0b10010]
+    assert columns['-o'].values == ['f'] and \
+            list(columns['-o'].codes) == [-1, -1, -1, 0, -1]
+    assert columns['<x>'].values == ['a', 'b', 'c']
+    assert list(columns['<x>'].offsets) == [0, 2, 3, 3, 4, 5]
+    assert list(columns['<x>'].codes) == [0, 1, 0, 2, 0]
+    assert columns.hits == 1 and columns.throughput > 0
+
+
+def test_columns_to_numpy():
+    numpy = importorskip('numpy')
+    columns = docopt_many('Usage: prog [-v] <x>...\n\n-v',
+                          ['-v a b', 'c', '-v a'], columns=True)
+    assert columns['-v'].to_numpy().tolist() == [True, False, True]
+    offsets, codes = columns['<x>'].to_numpy()
+    assert offsets.tolist() == [0, 2, 3, 4] and codes.tolist() == [0, 1, 2, 0]
+    assert numpy.bincount(codes).tolist() == [2, 1, 1]
+
+
+def test_profile():
+    doc = 'Usage: prog [-v] <x>\n\n-v'
+    with profile() as p:
+        assert compile(doc).parse('-v a') == {'-v': True, '<x>': 'a'}
+        with raises(DocoptExit):
+            compile(doc).parse('a b')
+        with profile() as inner:
+            compile(doc).parse('a')
+    assert [p.calls[phase] for phase in p.phases] == [3, 3, 3, 3, 3, 3, 2]
+    assert [inner.calls[phase] for phase in p.phases] == [1] * 7
+    assert p.seconds['match'] > inner.seconds['match'] > 0
+    assert p.seconds['match'] > 0 and 'match' in p.report()
+    compile(doc).parse('a')
+    assert p.calls['result'] == 2
+    tracemalloc = importorskip('tracemalloc')
+    with profile(memory=True) as p:
+        with profile(memory=True) as inner:
+            compile('Usage: prog [-v] <x>...\n\n-v').parse(['a'] * 1000 +
+                                                          ['-v'])
+    assert p.peak['tokens'] > p.peak['usage'] > 0 and 'peak' in p.report()
+    assert [abs(p.peak[phase] - inner.peak[phase]) < 1024  # but laps' own
+            for phase in p.phases] == [True] * 7
+    assert not tracemalloc.is_tracing()
+
+
+def test_memory_budgets():
+    memory = _import_from('benchmarks', 'memory')
+    assert memory.check({'a:match': 2048, 'b:match': 512},
+                        {'*:match': 1024}) == [('a:match', 1024, 2048)]
+    tracemalloc = importorskip('tracemalloc')
+    with open(memory.default_budgets) as f:
+        recorded = json.load(f)
+    if not hasattr(tracemalloc, 'reset_peak') or \
+            recorded['python'] != memory.python():
+        skip('memory budgets were recorded with Python %s' %
+             recorded['python'])
+    assert memory.check(memory.measure(quick=True),
+                        recorded['budgets']) == []
+
+
+def test_count():
+    parser = compile('Usage: prog (a|b) <x> [-v]\n\n-v')
+    match = Either._match
+    with count() as c:
+        parser.parse('b x -v')
+        with count() as inner:
+            with raises(DocoptExit):
+                parser.parse('c')
+    assert inner.counts == {'visits': 6, 'backtracks': 5, 'copies': 1,
+                            'lookups': 0, 'tokens': 2}
+    assert c.counts == {'visits': 9 + 6, 'backtracks': 1 + 5, 'copies': 5 + 1,
+                        'lookups': 2, 'tokens': 4 + 2}
+    assert Either._match is match
+    parser.parse('a x')
+    assert c.counts['visits'] == 15
+
+
+def test_operation_counts():
+    operation_counts = _import_from('language_agnostic_test',
+                                    'operation_counts')
+    with open(operation_counts.golden) as f:
+        recorded = json.load(f)
+    grown, shrunk = operation_counts.compare(operation_counts.counts(),
+                                             recorded)
+    assert grown == []
+
+
+def test_complete():
+    parser = compile("""Usage: prog ship new <name>...
+                             prog ship <name> move <x> <y> [--speed=<kn>]
+                             prog mine (set|remove) [--moored|--drifting]
+
+                      --speed=<kn>
+                      --moored
+                      --drifting""")
+    names = lambda argv: [l.name for l in parser.complete(argv)]
+    assert names('') == ['ship', 'mine', '--speed', '--moored', '--drifting']
+    assert names('ship') == ['new', '<name>', '--speed']
+    assert names('ship new') == ['<name>', 'move', '--speed']
+    assert names('ship new a b') == ['<name>']
+    assert names('ship a move 1') == ['<y>', '--speed']
+    assert names('ship a --speed 3 move') == ['<x>']
+    assert names('--speed=3 ship') == ['<name>']
+    assert names('mine --moored set') == []
+    assert names('mine remove --drifting') == []
+    assert names('mine set --speed 3') == []
+    assert parser.complete('--speed') == [Option(None, '--speed', 1)]
+    assert parser.complete(['ship', 'a', '--sp']) == \
+            [Option(None, '--speed', 1)]
+    with raises(DocoptExit):
+        parser.complete('--speed=3 --nope')
+    from docopt_codegen import docstring
+    git = compile(docstring(os.path.join(os.path.dirname(__file__),
+                                         'examples', 'git_example.py')))
+    assert git.complete('remote add -t') == [Option('-t', None, 1)]
+    assert git.complete('remote add -ft') == [Option('-t', None, 1)]
+
+
+def test_daemon(tmpdir):
+    import threading
+    import docopt_daemon
+    path = str(tmpdir.join('docopt.sock'))
+    server = docopt_daemon.Server(path)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        client = docopt_daemon.Client(path)
+        doc = 'Usage: prog [-v] <x>\n\n-h --help\n-v'
+        usage = 'Usage: prog [-v] <x>'
+        assert client.request(doc, ['-v', 'a']) == \
+                {'result': {'--help': False, '-v': True, '<x>': 'a'}}
+        assert client.request(doc, 'a b') == \
+                {'reason': '', 'usage': usage, 'status': 1}
+        assert client.request(doc, '-x') == \
+                {'reason': '-x is not recognized', 'usage': usage, 'status': 1}
+        assert client.request(doc, '-h') == {'output': doc, 'status': 0}
+        with raises(DocoptExit):
+            client.docopt(doc, 'a b')
+        with raises(DocoptLanguageError):
+            client.request('Usage: prog (', [])
+        fixtures = _import_from('language_agnostic_test',
+                                'language_agnostic_tester').fixtures
+        for index, doc, argv, expect in fixtures():
+            try:
+                result = client.docopt(doc, argv)
+            except DocoptExit:
+                result = 'user-error'
+            assert result == json.loads(expect), index
+        client.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+    assert not os.path.exists(path)
+
+
+def test_daemon_socket_checks(tmpdir, monkeypatch):
+    import socket
+    import stat
+    import docopt_daemon
+    doc = 'Usage: prog <x>'
+    path = str(tmpdir.join('docopt.sock'))
+    tmpdir.join('docopt.sock').write('not a socket')
+    with raises(socket.error):
+        docopt_daemon.Client(path)
+    with raises(socket.error):
+        docopt_daemon.Server(path)
+    assert docopt_daemon.docopt(doc, 'a', path=path) == {'<x>': 'a'}
+    os.remove(path)
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()  # nobody listens, as if daemon was killed
+    server = docopt_daemon.Server(path)
+    try:
+        with raises(socket.error):  # doesn't take over a live socket
+            docopt_daemon.Server(path)
+        assert os.path.exists(path)
+    finally:
+        server.server_close()
+    shared = tmpdir.join('shared')
+    shared.mkdir()
+    os.chmod(str(shared), stat.S_IRWXU | stat.S_IRWXG | stat.S_IRWXO)
+    with raises(socket.error):
+        docopt_daemon.private_directory(str(shared))
+    private = str(tmpdir.join('private'))
+    assert docopt_daemon.private_directory(private) == private
+    assert stat.S_IMODE(os.stat(private).st_mode) == stat.S_IRWXU
+    monkeypatch.delenv('DOCOPT_SOCKET', raising=False)
+    monkeypatch.delenv('XDG_RUNTIME_DIR', raising=False)
+    assert docopt_daemon.default_socket() == \
+            '/tmp/docopt-%d/docopt.sock' % os.getuid()